@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import secrets
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+import db
+import metrics
+import recommendations
+from migrate import ensure_schema
+from omdb import fetch_movie_details, fetch_movie_details_batch
+from resources import is_ready, resource_report, warm_up
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", 8000))
+API_WORKERS = int(os.getenv("API_WORKERS", 1))
+# When set, every request must send "Authorization: Bearer <token>"
+API_TOKEN = os.getenv("RECOMMENDER_API_TOKEN")
+MAX_BATCH = int(os.getenv("API_MAX_BATCH", 100))
+MAX_K = 50
+
+
+# Headless service over the same functions the Streamlit app calls. Handlers
+# are plain functions, so FastAPI runs them in its thread pool and the event
+# loop stays free while a handler waits on Postgres or OMDb. Each worker
+# process loads its own (memory-mapped) catalog on startup.
+@asynccontextmanager
+async def lifespan(app):
+    metrics.start(port=0)
+    await run_in_threadpool(warm_up)
+    await run_in_threadpool(ensure_schema)
+    yield
+
+
+def check_token(authorization: str = Header(None)):
+    if API_TOKEN is None:
+        return
+    if authorization is None or not secrets.compare_digest(authorization, f"Bearer {API_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid or missing API token")
+
+
+app = FastAPI(title="Movie recommendations", lifespan=lifespan, dependencies=[Depends(check_token)])
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+# Every request is timed under its route template, e.g.
+# "http GET /users/{username}/watchlist"
+@app.middleware("http")
+async def time_requests(request, call_next):
+    started = time.perf_counter()
+    error = True
+    try:
+        response = await call_next(request)
+        error = response.status_code >= 500
+        return response
+    finally:
+        route = request.scope.get("route")
+        name = f"http {request.method} {route.path if route is not None else 'unmatched'}"
+        metrics.record(name, time.perf_counter() - started, error)
+
+
+class BatchRequest(BaseModel):
+    titles: list[str]
+    k: int = 5
+    offset: int = 0
+
+
+class TitlesRequest(BaseModel):
+    titles: list[str]
+
+
+class WatchlistEntry(BaseModel):
+    movie_id: int
+    title: str
+    poster_url: str | None = None
+    genre: str | None = None
+    year: str | int | None = None
+    imdb_rating: str | float | None = None
+
+
+def _check_batch(titles):
+    if len(titles) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} titles per request")
+
+
+def _wants_ndjson(request):
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+
+# One JSON line per title, in request order, each sent as soon as it is ready
+def _ndjson(titles, lookup):
+    async def lines():
+        for title in titles:
+            result = await run_in_threadpool(lookup, title)
+            yield json.dumps({"title": title, "result": result}) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/health")
+def health():
+    catalog = recommendations.current_catalog()
+    return {"ready": is_ready(), "catalog_version": catalog.version, "catalog_source": catalog.source}
+
+
+@app.get("/resources")
+def resources():
+    return resource_report()
+
+
+# Counters of this worker process only; with several workers each scrape
+# reaches one of them
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_text():
+    return metrics.prometheus_text()
+
+
+# Folded stacks from the sampling profiler (METRICS_PROFILE=1)
+@app.get("/metrics/profile", response_class=PlainTextResponse)
+def profile_text():
+    return metrics.profiler.folded()
+
+
+@app.get("/titles")
+def titles():
+    catalog = recommendations.current_catalog()
+    return {"catalog_version": catalog.version, "titles": catalog.movies["title"].tolist()}
+
+
+@app.get("/search")
+def search(q: str, limit: int = Query(20, ge=1, le=100)):
+    return recommendations.search_titles(q, limit)
+
+
+@app.get("/recommendations")
+def recommend(title: str, k: int = Query(5, ge=1, le=MAX_K), offset: int = Query(0, ge=0)):
+    return recommendations.recommend(title, k, offset)
+
+
+@app.post("/recommendations/batch")
+def recommend_batch(body: BatchRequest, request: Request):
+    _check_batch(body.titles)
+    if not 1 <= body.k <= MAX_K or body.offset < 0:
+        raise HTTPException(status_code=422, detail=f"k must be between 1 and {MAX_K}, offset at least 0")
+    if _wants_ndjson(request):
+        return _ndjson(body.titles, lambda title: recommendations.recommend(title, body.k, body.offset))
+    return recommendations.recommend_batch(body.titles, body.k, body.offset)
+
+
+@app.get("/users/{username}/recommendations")
+def recommend_for_user(username: str, k: int = Query(5, ge=1, le=MAX_K)):
+    return recommendations.recommend_for_user(username, k)
+
+
+@app.get("/movies/details")
+def movie_details(title: str):
+    return fetch_movie_details(title)
+
+
+@app.post("/movies/details/batch")
+def movie_details_batch(body: TitlesRequest, request: Request):
+    _check_batch(body.titles)
+    if _wants_ndjson(request):
+        return _ndjson(body.titles, lambda title: fetch_movie_details_batch([title])[0])
+    return fetch_movie_details_batch(body.titles)
+
+
+@app.get("/users/{username}/watchlist")
+def watchlist(username: str):
+    columns = ("movie_id", "title", "poster_url", "genre", "year", "imdb_rating")
+    return [dict(zip(columns, row)) for row in db.get_watchlist(username)]
+
+
+@app.post("/users/{username}/watchlist")
+def add_to_watchlist(username: str, entry: WatchlistEntry):
+    added = db.add_to_watchlist(username, entry.movie_id, entry.title, entry.poster_url, entry.genre,
+                                entry.year, entry.imdb_rating)
+    return {"added": added}
+
+
+@app.delete("/users/{username}/watchlist/{movie_id}")
+def remove_from_watchlist(username: str, movie_id: int):
+    db.remove_from_watchlist(username, movie_id)
+    return {"removed": True}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve recommendations over HTTP")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    args = parser.parse_args()
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
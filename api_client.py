@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from metrics import timed
+
+load_dotenv()
+
+# When set, the Streamlit app calls the recommendation service at this URL
+# instead of loading the catalog itself
+RECOMMENDER_API_URL = os.getenv("RECOMMENDER_API_URL", "").rstrip("/")
+RECOMMENDER_API_TOKEN = os.getenv("RECOMMENDER_API_TOKEN")
+RECOMMENDER_API_TIMEOUT = float(os.getenv("RECOMMENDER_API_TIMEOUT", 10))
+# How long the title list fetched for the movie selectbox is reused, in seconds
+TITLES_TTL = float(os.getenv("CATALOG_RELOAD_INTERVAL", 10))
+
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+if RECOMMENDER_API_TOKEN:
+    session.headers["Authorization"] = f"Bearer {RECOMMENDER_API_TOKEN}"
+
+_titles = None
+_titles_fetched = 0.0
+_titles_lock = threading.Lock()
+
+
+def _request(method, path, **kwargs):
+    response = session.request(method, RECOMMENDER_API_URL + path, timeout=RECOMMENDER_API_TIMEOUT, **kwargs)
+    response.raise_for_status()
+    return response
+
+
+def _get(path, **params):
+    return _request("GET", path, params=params).json()
+
+
+def movie_titles():
+    global _titles, _titles_fetched
+    with _titles_lock:
+        if _titles is None or time.monotonic() - _titles_fetched >= TITLES_TTL:
+            _titles = _get("/titles")["titles"]
+            _titles_fetched = time.monotonic()
+        return _titles
+
+
+@timed("api_client.search_titles")
+def search_titles(query, limit=20):
+    return _get("/search", q=query, limit=limit)
+
+
+@timed("api_client.recommend")
+def recommend(movie, k=5, offset=0):
+    return _get("/recommendations", title=movie, k=k, offset=offset)
+
+
+@timed("api_client.recommend_for_user")
+def recommend_for_user(username, k=5):
+    return _get(f"/users/{requests.utils.quote(username, safe='')}/recommendations", k=k)
+
+
+@timed("api_client.recommend_batch")
+def recommend_batch(titles, k=5, offset=0):
+    return _request("POST", "/recommendations/batch", json={"titles": titles, "k": k, "offset": offset}).json()
+
+
+# Yields (title, recommendations) as the service streams each one
+def stream_recommendations(titles, k=5, offset=0):
+    with session.post(RECOMMENDER_API_URL + "/recommendations/batch", json={"titles": titles, "k": k, "offset": offset},
+                      headers={"Accept": "application/x-ndjson"}, stream=True, timeout=RECOMMENDER_API_TIMEOUT) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                entry = json.loads(line)
+                yield entry["title"], entry["result"]
+
+
+@timed("api_client.fetch_movie_details")
+def fetch_movie_details(movie_title):
+    return _get("/movies/details", title=movie_title)
+
+
+def _watchlist_path(username):
+    return f"/users/{requests.utils.quote(username, safe='')}/watchlist"
+
+
+@timed("api_client.add_to_watchlist")
+def add_to_watchlist(username, movie_id, movie_name, poster_url, genre, year, imdb_rating):
+    entry = {"movie_id": movie_id, "title": movie_name, "poster_url": poster_url, "genre": genre,
+             "year": year, "imdb_rating": imdb_rating}
+    return _request("POST", _watchlist_path(username), json=entry).json()["added"]
+
+
+@timed("api_client.remove_from_watchlist")
+def remove_from_watchlist(username, movie_id):
+    _request("DELETE", f"{_watchlist_path(username)}/{int(movie_id)}")
+
+
+# Same row layout as db.get_watchlist
+@timed("api_client.get_watchlist")
+def get_watchlist(username):
+    return [
+        (movie["movie_id"], movie["title"], movie["poster_url"], movie["genre"], movie["year"], movie["imdb_rating"])
+        for movie in _get(_watchlist_path(username))
+    ]
+
+
+def resource_report():
+    return _get("/resources")
@@ -1,9 +1,20 @@
-import time
+import os
 import pandas as pd
 import streamlit as st
-from auth import get_all_users, add_user, delete_user, update_user
-from ui import add_custom_css, signup, login, show_movie_recommendations
-from db import create_tables, get_watchlist, remove_from_watchlist
+from auth import ROLES, USER_PAGE_SIZE, add_users, count_users, delete_users, list_users, update_users
+from ui import add_custom_css, signup, login, show_movie_recommendations, flash, queue_write, show_flashes, with_pending_writes, reconcile_writes, check_session, clear_login
+from migrate import ensure_schema
+import metrics
+from metrics import gauge_values, profiler, span, span_summary, timed
+from paths import STATIC_DIR
+from resources import format_report, warm_up
+from posters import poster_images
+from api_client import RECOMMENDER_API_URL
+
+if RECOMMENDER_API_URL:
+    from api_client import get_watchlist, remove_from_watchlist, resource_report
+else:
+    from db import get_watchlist, remove_from_watchlist
 
 # Initialize session state
 if "logged_in" not in st.session_state:
@@ -20,7 +31,7 @@ if "view" not in st.session_state:
 def homepage():
     st.title("🎬 Movie Recommendation System")
     st.image(
-        "/home/rguktrkvalley/PycharmProjects/movie-recommendation/static/index.jpg",
+        os.path.join(STATIC_DIR, "index.jpg"),
         use_container_width=True,
     )
 
@@ -77,8 +88,7 @@ def homepage():
         """
     )
     if st.button("Start Discovering Movies Now"):
-        st.balloons()
-        time.sleep(2)
+        flash("Let's find your next favorite movie!", "info", balloons=True)
         st.session_state["view"] = "movie_recommendations"
         st.rerun()
 
@@ -93,87 +103,186 @@ def homepage():
     )
 
 def logout():
-    st.session_state["logged_in"] = False
-    st.session_state["username"] = ""
-    st.session_state["role"] = ""
-    st.session_state["view"] = "login"
-    st.success("You have been logged out. Redirecting to homepage...")
-    time.sleep(2)
+    clear_login()
+    flash("You have been logged out.")
     st.rerun()
 
 
 
 
+def _parse_user_lines(text):
+    rows = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split(",")]
+        if len(parts) != 3 or not parts[0] or parts[2] not in ROLES:
+            st.error(f"Line {number}: expected username,password,role with role one of {', '.join(ROLES)}")
+            return None
+        rows.append(tuple(parts))
+    return rows
+
+
+def _run_bulk(operation, rows, verb):
+    if not rows:
+        st.error("Nothing to do.")
+        return
+    try:
+        count = operation(rows)
+    except Exception as e:
+        st.error(f"Error: {e}")
+        return
+    flash(f"{count} of {len(rows)} users {verb}.", "success" if count == len(rows) else "warning")
+    st.session_state["view"] = "dashboard"
+    st.rerun()
+
+
 # Admin Dashboard with CRUD operations
 def admin_dashboard():
     st.subheader(":bar_chart: Admin Dashboard")
     st.write("---")
 
 
-    # Display user data
-    users = get_all_users()
-    if users:
-        st.write("### Current Users")
-        user_data = pd.DataFrame(users, columns=["ID", "Username", "Password", "Role"])
-        user_data.set_index("ID", inplace=True)
-        st.table(user_data)
-
-        # Add User Section
-        st.write("### Add New User")
-        with st.form("add_user_form"):
-            username = st.text_input("Username")
-            password = st.text_input("Password", type="password")
-            role = st.selectbox("Role", ["Admin", "User"])
-            submitted = st.form_submit_button("Add User")
-            if submitted:
-                add_user(username, password, role)
-                st.session_state["view"] = "dashboard"
-                st.rerun()
+    # Display user data, one page at a time
+    st.write("### Current Users")
+    filter_cols = st.columns([2, 1])
+    prefix = filter_cols[0].text_input("Username starts with", key="user_prefix").strip()
+    role_filter = filter_cols[1].selectbox("Role", ["All", *ROLES], key="user_role_filter")
+    role_filter = None if role_filter == "All" else role_filter
 
-        # Edit User Section
-        st.write("### Edit User")
-        with st.form("edit_user_form"):
-            username = st.text_input("Username", key="username_input")
-            new_password = st.text_input("New Password", type="password", key="password_input")
-            new_role = st.selectbox("New Role", ["Admin", "User"], key="edit_role")
-            if st.form_submit_button("Update User"):
-                update_user(username, new_password, new_role)
-                st.session_state["view"] = "dashboard"
-                st.rerun()
+    # Keyset cursors: the username each visited page starts after
+    if st.session_state.get("user_filter") != (prefix, role_filter):
+        st.session_state["user_filter"] = (prefix, role_filter)
+        st.session_state["user_page_cursors"] = [None]
+    cursors = st.session_state["user_page_cursors"]
+    users = list_users(prefix, role_filter, after=cursors[-1], limit=USER_PAGE_SIZE + 1)
+    has_next = len(users) > USER_PAGE_SIZE
+    users = users[:USER_PAGE_SIZE]
 
-        # Delete User Section
-        st.write("### Delete User")
-        with st.form("delete_user_form"):
-            username = st.text_input("Username",key="delete_user")
-            if st.form_submit_button("Delete User"):
-                delete_user(username)
-                st.session_state["view"] = "dashboard"
-                st.rerun()
+    total = count_users(prefix, role_filter)
+    if users:
+        user_data = pd.DataFrame(users, columns=["ID", "Username", "Role"])
+        user_data.set_index("ID", inplace=True)
+        st.dataframe(user_data, use_container_width=True)
     else:
         st.write("No users found.")
+    first = (len(cursors) - 1) * USER_PAGE_SIZE
+    st.caption(f"Showing {first + 1 if users else 0}-{first + len(users)} of {total} users")
+    nav = st.columns(2)
+    if nav[0].button("Previous page", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if nav[1].button("Next page", disabled=not has_next):
+        cursors.append(users[-1][1])
+        st.rerun()
+
+    # Add User Section
+    st.write("### Add New User")
+    with st.form("add_user_form"):
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
+        role = st.selectbox("Role", list(ROLES))
+        if st.form_submit_button("Add User"):
+            if username and password:
+                _run_bulk(add_users, [(username, password, role)], "added")
+            else:
+                st.error("Please fill out all fields.")
+
+    # Edit User Section
+    st.write("### Edit User")
+    with st.form("edit_user_form"):
+        username = st.text_input("Username", key="username_input")
+        new_password = st.text_input("New Password (blank keeps the current one)", type="password", key="password_input")
+        new_role = st.selectbox("New Role", list(ROLES), key="edit_role")
+        if st.form_submit_button("Update User"):
+            _run_bulk(update_users, [(username, new_password, new_role)], "updated")
+
+    # Delete User Section
+    st.write("### Delete Users")
+    with st.form("delete_user_form"):
+        selected = st.multiselect("Users on this page", [u[1] for u in users], key="delete_users")
+        if st.form_submit_button("Delete Users"):
+            _run_bulk(delete_users, selected, "deleted")
+
+    # Many users at once, each operation in one transaction
+    with st.expander("Bulk add or update"):
+        with st.form("bulk_users_form"):
+            lines = st.text_area("One user per line: username,password,role (leave the password empty to keep it when updating)")
+            action = st.radio("Action", ["Add", "Update"], horizontal=True)
+            if st.form_submit_button("Apply"):
+                rows = _parse_user_lines(lines)
+                if rows is not None:
+                    if action == "Add":
+                        if all(password for _, password, _ in rows):
+                            _run_bulk(add_users, rows, "added")
+                        else:
+                            st.error("Every new user needs a password.")
+                    else:
+                        _run_bulk(update_users, rows, "updated")
+
+    # Shared resources loaded by this server process
+    with st.expander("Loaded resources"):
+        st.code(format_report(resource_report() if RECOMMENDER_API_URL else warm_up()))
+
+    # Latency percentiles of instrumented calls and cache and pool counters,
+    # for this server process since it started
+    with st.expander("Performance"):
+        spans = span_summary()
+        if spans:
+            rows = [
+                {"span": name, "count": stats["count"], "errors": stats["errors"],
+                 **{f"p{q * 100:g} ms": value * 1000 for q, value in stats["quantiles"].items()},
+                 "max ms": stats["max"] * 1000}
+                for name, stats in spans.items()
+            ]
+            st.dataframe(pd.DataFrame(rows).set_index("span").round(2), use_container_width=True)
+        else:
+            st.write("Nothing recorded yet.")
+        if RECOMMENDER_API_URL:
+            st.caption(f"The recommendation service reports its own at {RECOMMENDER_API_URL}/metrics")
+        st.write("**Counters**")
+        st.json(gauge_values(), expanded=False)
+
+        profiling = st.checkbox("Sampling profiler", value=profiler.running, key="profiler_enabled")
+        if profiling and not profiler.running:
+            profiler.start()
+        elif not profiling and profiler.running:
+            profiler.stop()
+        top = profiler.top(15)
+        if top:
+            st.caption(f"{profiler.samples} samples; share of samples each function was running (self) or on the stack (inclusive)")
+            st.dataframe(pd.DataFrame(top).set_index("function").mul(100).round(1), use_container_width=True)
+            st.download_button("Download folded stacks", profiler.folded(), "profile.folded")
+        if st.button("Reset measurements"):
+            metrics.reset()
+            profiler.clear()
+            st.rerun()
 
 
 
 
 
 def display_watchlist(username):
-    watchlist = get_watchlist(username)  # Fetch the watchlist from your database
+    show_flashes()
+    watchlist = with_pending_writes(get_watchlist(username))  # Fetch the watchlist from your database
     st.subheader("Your Watchlist")
+    reconcile_writes()
 
     if watchlist:
         # Convert watchlist to DataFrame for better handling
-        watchlist_df = pd.DataFrame(watchlist, columns=["ID", "Username", "Movie Name", "Poster URL", "Genre", "Year", "IMDb Rating"])
+        watchlist_df = pd.DataFrame(watchlist, columns=["ID", "Movie Name", "Poster URL", "Genre", "Year", "IMDb Rating"])
         watchlist_df.set_index("ID", inplace=True)
 
         # Display the watchlist as an interactive dataframe
         # st.dataframe(watchlist_df[["Movie Name", "Genre", "Year", "IMDb Rating"]])
 
         # Display each movie with its poster and details
+        posters = dict(zip(watchlist_df.index, poster_images(watchlist_df['Poster URL'].tolist(), 100)))
         for idx, row in watchlist_df.iterrows():
             st.markdown(f"**{row['Movie Name']}**")
             cols = st.columns([1, 3])
             with cols[0]:
-                st.image(row['Poster URL'], width=100)
+                st.image(posters[idx], width=100)
             with cols[1]:
                 st.markdown(f"**Genre:** {row['Genre']}")
                 st.markdown(f"**Year:** {row['Year']}")
@@ -181,17 +290,29 @@ def display_watchlist(username):
 
             # Button to remove the movie from the watchlist
             if st.button(f"Remove from Watchlist", key=f"remove_{idx}"):
-                remove_from_watchlist(username, row['Movie Name'])
-                st.success(f"Removed {row['Movie Name']} from your watchlist.")
+                title = row['Movie Name']
+                queue_write(lambda _: (f"Removed {title} from your watchlist.", "success"),
+                            remove_from_watchlist, username, idx, change=("remove", idx))
                 st.rerun()  # Refresh the watchlist display
     else:
         st.write("Your watchlist is empty.")
 
 
 
+# Runs once per process; later sessions and reruns reuse the loaded catalog
+@st.cache_resource(show_spinner="Loading the movie catalog...")
+def load_resources():
+    metrics.start()
+    return warm_up(catalog=not RECOMMENDER_API_URL)
+
+
+@timed("app.run")
 def main():
+    load_resources()
     add_custom_css()
-    create_tables()
+    check_session()
+    show_flashes()
+    ensure_schema()
 
     st.sidebar.title("🧭 Navigation")
     if st.session_state.get("logged_in", False):
@@ -218,23 +339,25 @@ def main():
             logout()
 
         # Display views based on session state
-        if st.session_state["view"] == "homepage":
-            homepage()
-        elif st.session_state["view"] == "dashboard":
-            admin_dashboard()
-        elif st.session_state["view"] == "movie_recommendations":
-            show_movie_recommendations()
-        elif st.session_state["view"] == "watchlist":
-            display_watchlist(st.session_state["username"])
+        with span(f"view.{st.session_state['view']}"):
+            if st.session_state["view"] == "homepage":
+                homepage()
+            elif st.session_state["view"] == "dashboard":
+                admin_dashboard()
+            elif st.session_state["view"] == "movie_recommendations":
+                show_movie_recommendations()
+            elif st.session_state["view"] == "watchlist":
+                display_watchlist(st.session_state["username"])
 
     else:
         st.sidebar.button("Login", key="go_to_login", on_click=lambda: st.session_state.update(view="login"))
         st.sidebar.button("Sign Up", key="go_to_signup", on_click=lambda: st.session_state.update(view="signup"))
 
-        if st.session_state["view"] == "login":
-            login()
-        elif st.session_state["view"] == "signup":
-            signup()
+        with span(f"view.{st.session_state['view']}"):
+            if st.session_state["view"] == "login":
+                login()
+            elif st.session_state["view"] == "signup":
+                signup()
 
 
 if __name__ == "__main__":
@@ -1,79 +1,241 @@
+import base64
 import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
 import psycopg2
+from psycopg2.extras import execute_values
 import streamlit as st
-from db import connect_to_postgresql
+from db import get_cursor
+from metrics import timed
+from sessions import session_store
 
+# PBKDF2-SHA256 work factor for new hashes; stored hashes with a different
+# count are rehashed on the next successful login
+AUTH_KDF_ITERATIONS = int(os.getenv("AUTH_KDF_ITERATIONS", 600_000))
+# Hashing runs on this many threads, and at most AUTH_KDF_QUEUE more logins
+# wait for one, so a burst of logins cannot take every server thread
+AUTH_KDF_WORKERS = int(os.getenv("AUTH_KDF_WORKERS", 2))
+AUTH_KDF_QUEUE = int(os.getenv("AUTH_KDF_QUEUE", 32))
+KDF_PREFIX = "pbkdf2_sha256"
 
-def get_all_users():
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, username, password_hash, role FROM users')
-    users = cursor.fetchall()
-    conn.close()
-    return users
+_kdf_executor = ThreadPoolExecutor(max_workers=AUTH_KDF_WORKERS, thread_name_prefix="kdf")
+_kdf_slots = threading.BoundedSemaphore(AUTH_KDF_WORKERS + AUTH_KDF_QUEUE)
 
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+USER_PAGE_SIZE = 50
+# Seconds a total from count_users() is reused; user changes made through
+# this module clear it straight away
+USER_COUNT_TTL = float(os.getenv("USER_COUNT_TTL", 30))
+ROLES = ("Admin", "User")
 
+
+class LoginBusyError(Exception):
+    pass
+
+
+# Logins fail fast when the queue is full; bulk admin operations
+# (wait=True) queue behind them one hash at a time instead
+@timed("auth.kdf")
+def _pbkdf2(password, salt, iterations, wait=False):
+    if not _kdf_slots.acquire(blocking=wait):
+        raise LoginBusyError("Too many logins in progress, please try again")
+    try:
+        return _kdf_executor.submit(hashlib.pbkdf2_hmac, "sha256", password.encode(), salt, iterations).result()
+    finally:
+        _kdf_slots.release()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password, wait=False):
+    salt = secrets.token_bytes(16)
+    key = _pbkdf2(password, salt, AUTH_KDF_ITERATIONS, wait)
+    return f"{KDF_PREFIX}${AUTH_KDF_ITERATIONS}${_b64(salt)}${_b64(key)}"
+
+
+# Returns (matches, needs_rehash). Hashes from before the KDF are unsalted
+# SHA-256 hex digests.
+def verify_password(password, stored):
+    if stored.startswith(KDF_PREFIX + "$"):
+        _, iterations, salt, key = stored.split("$")
+        computed = _pbkdf2(password, _unb64(salt), int(iterations))
+        return hmac.compare_digest(computed, _unb64(key)), int(iterations) != AUTH_KDF_ITERATIONS
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, stored), True
+
+
+# Checked against when the user does not exist, so the response takes as long
+_dummy_hash = None
+
+
+def _verify_missing_user(password):
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    verify_password(password, _dummy_hash)
+
+@timed("auth.add_user")
 def add_user(username, password, role):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
     try:
         hashed_password = hash_password(password)
-        cursor.execute(
-            'INSERT INTO users (username, password_hash, role) VALUES (%s, %s, %s)',
-            (username, hashed_password, role)
-        )
-        conn.commit()
+        with get_cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO users (username, password_hash, role) VALUES (%s, %s, %s)',
+                (username, hashed_password, role)
+            )
+        _users_changed([])
         st.success("User created successfully!")
     except psycopg2.IntegrityError:
         st.error("Username already exists.")
-    finally:
-        conn.close()
+    except LoginBusyError as e:
+        st.error(str(e))
 
+@timed("auth.validate_user")
 def validate_user(username, password, role):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    hashed_password = hash_password(password)
-    cursor.execute(
-        'SELECT id FROM users WHERE username = %s AND password_hash = %s AND role = %s',
-        (username, hashed_password, role)
-    )
-    user = cursor.fetchone()
-    conn.close()
-    return user
-
-
-def update_user(username, new_password, new_role):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    try:
-        hashed_password = hash_password(new_password)
+    with get_cursor() as cursor:
         cursor.execute(
-            "UPDATE users SET password_hash = %s , role = %s WHERE username = %s",
-            (hashed_password, new_role, username)
+            'SELECT id, password_hash FROM users WHERE username = %s AND role = %s',
+            (username, role)
         )
-        conn.commit()
-        st.success(f"User '{username}' updated successfully!")
-    except Exception as e:
-        st.error(f"Error updating user: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        user = cursor.fetchone()
+    if user is None:
+        _verify_missing_user(password)
+        return None
 
+    user_id, stored = user
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        return None
+    if needs_rehash:
+        # The password was right, so a busy KDF pool only postpones the
+        # upgrade to the next login
+        try:
+            new_hash = hash_password(password)
+        except LoginBusyError:
+            return (user_id,)
+        # Guarded on the old hash so a concurrent password change wins
+        with get_cursor() as cursor:
+            cursor.execute(
+                'UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s',
+                (new_hash, user_id, stored)
+            )
+    return (user_id,)
+
+
+# Checks the password once and opens a server-side session; returns its
+# token, or None for wrong credentials
+def log_in(username, password, role):
+    user = validate_user(username, password, role)
+    if user is None:
+        return None
+    return session_store.create(user[0], username, role)
+
+
+_user_counts = {}
+_user_counts_lock = threading.Lock()
+
+
+def _users_changed(usernames):
+    with _user_counts_lock:
+        _user_counts.clear()
+    for username in usernames:
+        session_store.end_user(username)
+
+
+def _user_filter(prefix, role):
+    clauses, params = [], []
+    if prefix:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append('username COLLATE "C" LIKE %s')
+        params.append(escaped + "%")
+    if role:
+        clauses.append("role = %s")
+        params.append(role)
+    return clauses, params
 
-def delete_user(username):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM users WHERE username = %s", (username,))
-        conn.commit()
-        st.success("User deleted successfully!")
-    except Exception as e:
-        st.error(f"Error deleting user: {e}")
-    finally:
-        conn.close()
 
+# One page of (id, username, role) in username order, starting after the
+# username `after` (keyset pagination: the cost does not grow with the page
+# number). Password hashes are never read.
+@timed("auth.list_users")
+def list_users(prefix="", role=None, after=None, limit=USER_PAGE_SIZE):
+    clauses, params = _user_filter(prefix, role)
+    if after is not None:
+        clauses.append('username COLLATE "C" > %s')
+        params.append(after)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    with get_cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, username, role FROM users {where}ORDER BY username COLLATE "C" LIMIT %s',
+            params + [limit]
+        )
+        return cursor.fetchall()
+
+
+@timed("auth.count_users")
+def count_users(prefix="", role=None):
+    key = (prefix, role)
+    with _user_counts_lock:
+        cached = _user_counts.get(key)
+    if cached is not None and time.monotonic() - cached[1] < USER_COUNT_TTL:
+        return cached[0]
+    clauses, params = _user_filter(prefix, role)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    with get_cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM users{where}", params)
+        count = cursor.fetchone()[0]
+    with _user_counts_lock:
+        _user_counts[key] = (count, time.monotonic())
+    return count
+
+
+# Bulk operations each run in one transaction on one connection. Passwords
+# are hashed first, outside the transaction.
+@timed("auth.add_users")
+def add_users(users):
+    rows = [(username, hash_password(password, wait=True), role) for username, password, role in users]
+    with get_cursor() as cursor:
+        inserted = execute_values(
+            cursor,
+            "INSERT INTO users (username, password_hash, role) VALUES %s ON CONFLICT (username) DO NOTHING "
+            "RETURNING username",
+            rows, fetch=True
+        )
+    _users_changed([])
+    return len(inserted)
+
+
+# users: (username, new_password or None to keep it, new_role)
+@timed("auth.update_users")
+def update_users(users):
+    rows = [(username, hash_password(password, wait=True) if password else None, role)
+            for username, password, role in users]
+    with get_cursor() as cursor:
+        updated = execute_values(
+            cursor,
+            "UPDATE users SET password_hash = COALESCE(v.password_hash, users.password_hash), role = v.role "
+            "FROM (VALUES %s) AS v (username, password_hash, role) WHERE users.username = v.username "
+            "RETURNING users.username",
+            rows, template="(%s, %s::varchar, %s)", fetch=True
+        )
+    _users_changed([username for username, in updated])
+    return len(updated)
 
 
+@timed("auth.delete_users")
+def delete_users(usernames):
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM users WHERE username = ANY(%s) RETURNING username", (list(usernames),))
+        deleted = [username for username, in cursor.fetchall()]
+    _users_changed(deleted)
+    return len(deleted)
@@ -0,0 +1,74 @@
+import argparse
+import time
+
+import numpy as np
+from scipy import sparse
+
+from benchmarks.report import summarize
+from neighbors import IVF_RERANK, ExactEngine, IVFEngine
+from pipeline import normalize_rows
+
+
+# Sparse tag vectors drawn around a few hundred topics, roughly the shape of
+# the tag matrix the pipeline produces
+def synthetic_vectors(count, vocabulary=5000, topics=200, terms=40, seed=0):
+    rng = np.random.default_rng(seed)
+    topic_terms = rng.integers(0, vocabulary, size=(topics, terms))
+    topic = rng.integers(0, topics, size=count)
+    from_topic = topic_terms[topic[:, None], rng.integers(0, terms, size=(count, 30))]
+    noise = rng.integers(0, vocabulary, size=(count, 10))
+    columns = np.concatenate([from_topic, noise], axis=1).ravel()
+    rows = np.repeat(np.arange(count), 40)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)), shape=(count, vocabulary))
+    matrix.sum_duplicates()
+    return normalize_rows(matrix)
+
+
+def _latencies(engine, queries, n):
+    timings = []
+    for row in queries:
+        start = time.perf_counter()
+        engine.search_rows(np.array([row]), n)
+        timings.append(time.perf_counter() - start)
+    summary = summarize(timings)
+    return summary["p50_ms"], summary["p99_ms"]
+
+
+# Slot 0 of both is the query itself, which always matches, so recall@k is
+# taken over the k neighbors after it
+def _recall(found, truth):
+    return np.mean([len(set(f[1:]) & set(t[1:])) / len(t[1:]) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF engine against exact search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000, 500000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--rerank", type=int, default=IVF_RERANK)
+    args = parser.parse_args()
+
+    n = args.k + 1
+    for size in args.sizes:
+        vectors = synthetic_vectors(size)
+        queries = np.random.default_rng(1).choice(size, min(args.queries, size), replace=False)
+        exact = ExactEngine(vectors)
+        truth, _ = exact.search_rows(queries, n)
+        p50, p99 = _latencies(exact, queries, n)
+        print(f"{size:>8} movies  exact       recall@{args.k} 1.000  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+        start = time.perf_counter()
+        ivf = IVFEngine(vectors, rerank=args.rerank)
+        print(f"{size:>8} movies  ivf built in {time.perf_counter() - start:.1f} s, "
+              f"{len(ivf.centroids)} cells")
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            found, _ = ivf.search_rows(queries, n)
+            p50, p99 = _latencies(ivf, queries, n)
+            print(f"{size:>8} movies  ivf nprobe={nprobe:<3} recall@{args.k} {_recall(found, truth):.3f}  "
+                  f"p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
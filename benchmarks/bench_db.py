@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Catalog ids stop far below this; benchmark watchlists only use movie rows
+# from here up, so real movies are never touched
+BENCH_MOVIE_BASE = 2_000_000_000
+
+
+# The load tests write users, watchlists and movie rows. They only run when
+# BENCHMARK_DB names the database DB_NAME points at, so pointing them at
+# production by accident fails instead of writing there.
+def require_benchmark_db():
+    database = os.getenv("DB_NAME")
+    if not database or os.getenv("BENCHMARK_DB") != database:
+        sys.exit(f"Refusing to write to database {database!r}: set BENCHMARK_DB={database} "
+                 "if it is a throwaway benchmark database")
+
+
+# Users sharing one password hash; hashing each would only time the KDF
+def create_users(usernames, password):
+    from psycopg2.extras import execute_values
+
+    import auth
+    import db
+    from migrate import ensure_schema
+
+    ensure_schema()
+    password_hash = auth.hash_password(password, wait=True)
+    with db.get_cursor() as cursor:
+        execute_values(cursor, "INSERT INTO users (username, password_hash, role) VALUES %s "
+                               "ON CONFLICT (username) DO UPDATE SET password_hash = EXCLUDED.password_hash",
+                       [(username, password_hash, "User") for username in usernames])
+
+
+def existing_movie_ids():
+    import db
+
+    with db.get_cursor() as cursor:
+        cursor.execute("SELECT movie_id FROM movies")
+        return {movie_id for movie_id, in cursor.fetchall()}
+
+
+# Deleting the users removes their watchlists (ON DELETE CASCADE); then the
+# movie rows the run created: the benchmark id range plus movie_ids
+def cleanup(usernames, movie_ids=()):
+    import auth
+    import db
+
+    auth.delete_users(usernames)
+    with db.get_cursor() as cursor:
+        cursor.execute("DELETE FROM movies m WHERE (m.movie_id >= %s OR m.movie_id = ANY(%s::integer[])) "
+                       "AND NOT EXISTS (SELECT 1 FROM watchlist w WHERE w.movie_id = m.movie_id)",
+                       (BENCH_MOVIE_BASE, list(movie_ids)))
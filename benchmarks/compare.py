@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p99_ms")
+
+
+# Compares two result files from the same suite; exits 1 when any latency
+# grew by more than the threshold
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="ignore timings below this")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline["suite"] != candidate["suite"]:
+        sys.exit(f"Cannot compare suite {baseline['suite']!r} with {candidate['suite']!r}")
+
+    regressions = 0
+    print(f"{'benchmark':<36}{'metric':<8}{'baseline':>12}{'candidate':>12}{'change':>9}")
+    for name, before in baseline["results"].items():
+        after = candidate["results"].get(name)
+        if after is None:
+            continue
+        for metric in METRICS:
+            if metric not in before or metric not in after:
+                continue
+            old, new = before[metric], after[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if max(old, new) >= args.min_ms and change > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{name:<36}{metric:<8}{old:>10.2f}ms{new:>10.2f}ms{change:>+8.0%}{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
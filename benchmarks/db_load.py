@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import threading
+import time
+
+from benchmarks.bench_db import BENCH_MOVIE_BASE, cleanup, create_users, require_benchmark_db
+from benchmarks.report import print_table, summarize, write_results
+
+BENCH_PREFIX = "bench_user_"
+PASSWORD = "bench-password"
+# Relative frequency of each operation in the mix
+WEIGHTS = {
+    "auth.validate_user": 1,
+    "watchlist.get": 10,
+    "watchlist.add": 3,
+    "watchlist.remove": 3,
+    "users.list_page": 1,
+    "users.count": 1,
+}
+
+
+# Concurrent watchlist and auth queries against the Postgres configured by
+# DB_HOST/DB_NAME/DB_USER/DB_PASSWORD, which must be a benchmark database
+# (see bench_db). Creates its own users and movie rows and removes them
+# afterwards.
+def main():
+    parser = argparse.ArgumentParser(description="Load-test watchlist and auth queries against Postgres")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run the mix")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--kdf-iterations", type=int, help="override AUTH_KDF_ITERATIONS for this run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    require_benchmark_db()
+    if args.kdf_iterations:
+        os.environ["AUTH_KDF_ITERATIONS"] = str(args.kdf_iterations)
+    import auth
+    import db
+
+    usernames = [f"{BENCH_PREFIX}{i:05d}" for i in range(args.users)]
+    movie_ids = [(BENCH_MOVIE_BASE + i, f"Benchmark movie {i}") for i in range(500)]
+    create_users(usernames, PASSWORD)
+    try:
+        operations = {
+            "auth.validate_user": lambda rng, user: auth.validate_user(user, PASSWORD, "User"),
+            "watchlist.get": lambda rng, user: db.get_watchlist(user),
+            "watchlist.add": lambda rng, user: db.add_to_watchlist(user, *rng.choice(movie_ids), None, "Drama", "2009", "7.0"),
+            "watchlist.remove": lambda rng, user: db.remove_from_watchlist(user, rng.choice(movie_ids)[0]),
+            "users.list_page": lambda rng, user: auth.list_users(BENCH_PREFIX, "User", after=user),
+            "users.count": lambda rng, user: auth.count_users(BENCH_PREFIX),
+        }
+        names = list(WEIGHTS)
+        weights = [WEIGHTS[name] for name in names]
+        samples = {name: [] for name in names}
+        errors = {name: 0 for name in names}
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = {name: [] for name in names}
+            local_errors = {name: 0 for name in names}
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    operations[name](rng, rng.choice(usernames))
+                except Exception:
+                    local_errors[name] += 1
+                    continue
+                local[name].append(time.perf_counter() - started)
+            with lock:
+                for name in names:
+                    samples[name].extend(local[name])
+                    errors[name] += local_errors[name]
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(args.seed + i,)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = {name: dict(summarize(samples[name], elapsed), errors=errors[name]) for name in names}
+        results["all"] = summarize([s for name in names for s in samples[name]], elapsed)
+        results["pool"] = db.get_pool_stats()
+    finally:
+        cleanup(usernames)
+
+    print_table(results)
+    write_results("db_load", results, args.out, {
+        "threads": args.threads, "duration": args.duration, "users": args.users,
+        "kdf_iterations": auth.AUTH_KDF_ITERATIONS, "pool_max": db.DB_POOL_MAX,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import tempfile
+
+from benchmarks.report import print_table, timed, write_results
+from benchmarks.stub_omdb import StubOMDbServer
+
+
+# Load, rank, search and metadata calls one at a time, against a local OMDb
+# stub so results do not depend on the network
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the recommendation hot path")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub OMDb latency in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    server = StubOMDbServer(args.latency).start()
+    os.environ["OMDB_URL"] = server.url
+    # Scratch caches and request log, so runs leave nothing for the app to
+    # reuse (the result cache is pre-warmed from the request log)
+    scratch = tempfile.mkdtemp()
+    os.environ["OMDB_CACHE_PATH"] = os.path.join(scratch, "omdb.sqlite3")
+    os.environ["REQUEST_LOG_PATH"] = os.path.join(scratch, "recommend_requests.log")
+    import numpy as np
+
+    import omdb
+    import recommendations
+    from result_cache import result_cache
+    from build_index import ARTIFACT_DIR
+    from catalog import load_catalog
+    from profiles import UserProfile
+    from search_index import TitleSearchIndex
+
+    rng = random.Random(args.seed)
+    catalog = recommendations.current_catalog()
+    titles = catalog.movies["title"].tolist()
+    sample = [rng.choice(titles) for _ in range(args.repeat)]
+    queries = iter(sample * 4)
+    slow = max(10, args.repeat // 10)  # calls that wait on the stub
+
+    def next_title():
+        return next(queries)
+
+    results = {
+        "load.catalog": timed(lambda: load_catalog(ARTIFACT_DIR), max(5, args.repeat // 20)),
+        "load.search_index": timed(lambda: TitleSearchIndex(titles), 5),
+        "rank.single": timed(lambda: recommendations.rank(next_title(), 5, 0, catalog), args.repeat),
+        "rank.batch_32": timed(lambda: recommendations.rank_batch(rng.sample(titles, 32), 5, 0, catalog),
+                               args.repeat),
+    }
+
+    search = recommendations.search_titles
+    results["search.prefix"] = timed(lambda: search(next_title()[:4]), args.repeat)
+    results["search.typo"] = timed(lambda: search(next_title()[::-1][:6]), args.repeat)
+
+    def cold_details():
+        omdb.metadata_cache.clear()
+        omdb.fetch_movie_details(next_title())
+
+    results["metadata.cold"] = timed(cold_details, slow)
+    results["metadata.warm"] = timed(lambda: omdb.fetch_movie_details(sample[0]), args.repeat)
+
+    def cold_recommend():
+        omdb.metadata_cache.clear()
+        result_cache.clear()
+        recommendations.recommend(next_title())
+
+    def uncached_recommend():
+        result_cache.clear()
+        recommendations.recommend(sample[0])
+
+    results["recommend.cold"] = timed(cold_recommend, slow)
+    recommendations.recommend(sample[0])
+    results["recommend.metadata_cached"] = timed(uncached_recommend, args.repeat)
+    results["recommend.warm"] = timed(lambda: recommendations.recommend(sample[0]), args.repeat)
+
+    seeds = np.array(sorted(rng.sample(range(len(titles)), 20)))
+    results["profile.score_20_seeds"] = timed(lambda: UserProfile(catalog, seeds).scores(), args.repeat)
+
+    server.shutdown()
+    print_table(results)
+    write_results("micro", results, args.out, {
+        "repeat": args.repeat, "omdb_latency": args.latency, "catalog_source": catalog.source,
+        "catalog_rows": len(titles), "stub_requests": server.requests,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stub_omdb import StubOMDbServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs batched OMDb lookups against a local stub server")
+    parser.add_argument("--titles", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = StubOMDbServer(args.latency, args.failure_rate).start()
+    os.environ["OMDB_URL"] = server.url
+    os.environ["OMDB_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "omdb.sqlite3")
+    import omdb
+
+    def sequential(titles):
+        results = []
+        for title in titles:
+            try:
+                results.append(omdb.fetch_movie_details(title))
+            except Exception:
+                results.append(None)
+        return results
+
+    for name, fetch in (("sequential", sequential), ("batch", omdb.fetch_movie_details_batch)):
+        timings = []
+        for run in range(args.repeat):
+            omdb.metadata_cache.clear()
+            titles = [f"{name} {run} movie {i}" for i in range(args.titles)]
+            start = time.perf_counter()
+            results = fetch(titles)
+            timings.append(time.perf_counter() - start)
+        failed = sum(r is None for r in results)
+        print(f"{name:>10}: median {statistics.median(timings) * 1000:7.1f} ms for {args.titles} titles "
+              f"({failed} failed in last run)")
+    print(f"stub server handled {server.requests} requests")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
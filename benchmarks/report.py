@@ -0,0 +1,77 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+# Summary of latency samples in seconds, reported in milliseconds
+def summarize(samples, elapsed=None):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    summary = {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+    if elapsed:
+        summary["ops_per_second"] = len(ordered) / elapsed
+    return summary
+
+
+def timed(fn, repeat, *args):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Every suite writes the same envelope so runs can be compared with
+# benchmarks.compare regardless of which suite produced them
+def write_results(suite, results, path=None, parameters=None):
+    document = {
+        "suite": suite,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": parameters or {},
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return document
+
+
+def print_table(results):
+    for name, summary in results.items():
+        if "p50_ms" not in summary:
+            continue
+        rate = f"{summary['ops_per_second']:9.1f}/s" if "ops_per_second" in summary else ""
+        print(f"{name:<36} p50 {summary['p50_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms  "
+              f"n={summary['count']:<6}{rate}", file=sys.stderr)
@@ -0,0 +1,156 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_db import cleanup, create_users, existing_movie_ids, require_benchmark_db
+from benchmarks.report import print_table, summarize, write_results
+from benchmarks.stub_omdb import StubOMDbServer
+
+BENCH_PREFIX = "bench_session_"
+PASSWORD = "bench-password"
+
+
+# Replays many users clicking through the app at once: log in, search,
+# recommend, save a movie, open the watchlist, ask for "for you" picks and
+# log out. Each step calls what the corresponding view calls, so the
+# timings are page latencies minus Streamlit's own rendering; --render adds
+# full script runs through streamlit.testing for that part.
+def replay(user, titles, rng, think, steps):
+    from auth import log_in
+    from db import add_to_watchlist, get_watchlist
+    from recommendations import recommend, recommend_for_user, search_titles
+    from sessions import session_store
+
+    def step(name, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        steps.append((name, time.perf_counter() - started))
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+        return result
+
+    token = step("login", log_in, user, PASSWORD, "User")
+    title = rng.choice(titles)
+    suggestions = step("search", search_titles, title[:5])
+    picked = step("recommend", recommend, suggestions[0] if suggestions else title)
+    if picked:
+        movie = rng.choice(picked)
+        step("watchlist.add", add_to_watchlist, user, movie["movie_id"], movie["title"], movie["poster_url"],
+             movie["genre"], movie["year"], movie["imdb_rating"])
+    step("watchlist.view", get_watchlist, user)
+    step("for_you", recommend_for_user, user)
+    step("logout", session_store.end, token)
+
+
+def render_samples(count, user):
+    from streamlit.testing.v1 import AppTest
+
+    from paths import PACKAGE_DIR
+    from sessions import session_store
+
+    samples = {"render.recommendations": [], "render.recommend_click": [], "render.watchlist": []}
+    for _ in range(count):
+        at = AppTest.from_file(os.path.join(PACKAGE_DIR, "app.py"), default_timeout=60)
+        at.session_state["session_token"] = session_store.create(0, user, "User")
+        at.session_state["logged_in"] = True
+        at.session_state["username"] = user
+        at.session_state["role"] = "User"
+        at.session_state["view"] = "movie_recommendations"
+        for name, action in (
+            ("render.recommendations", lambda: at.run()),
+            ("render.recommend_click", lambda: at.button(key="movie_recommend_button").click().run()),
+            ("render.watchlist", lambda: at.button(key="watchlist_button").click().run()),
+        ):
+            started = time.perf_counter()
+            action()
+            samples[name].append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay simulated multi-user sessions")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions each user runs")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between steps in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub OMDb latency in seconds")
+    parser.add_argument("--kdf-iterations", type=int, help="override AUTH_KDF_ITERATIONS for this run")
+    parser.add_argument("--render", type=int, default=0, help="also time this many full Streamlit runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    require_benchmark_db()
+    server = StubOMDbServer(args.latency).start()
+    os.environ["OMDB_URL"] = server.url
+    # Scratch caches and request log, so runs leave nothing for the app to
+    # reuse (the result cache is pre-warmed from the request log)
+    scratch = tempfile.mkdtemp()
+    os.environ["OMDB_CACHE_PATH"] = os.path.join(scratch, "omdb.sqlite3")
+    os.environ["REQUEST_LOG_PATH"] = os.path.join(scratch, "recommend_requests.log")
+    if args.kdf_iterations:
+        os.environ["AUTH_KDF_ITERATIONS"] = str(args.kdf_iterations)
+    import auth
+    import db
+    from recommendations import current_catalog
+
+    usernames = [f"{BENCH_PREFIX}{i:05d}" for i in range(args.users)]
+    create_users(usernames, PASSWORD)
+    # Watchlists need real catalog ids for "for you"; the movie rows this run
+    # creates are deleted afterwards
+    movies_before = existing_movie_ids()
+    titles = current_catalog().movies["title"].tolist()
+
+    try:
+        steps = []
+        sessions = []
+        errors = []
+        lock = threading.Lock()
+
+        def user_loop(index):
+            rng = random.Random(args.seed + index)
+            for _ in range(args.sessions):
+                local = []
+                started = time.perf_counter()
+                try:
+                    replay(usernames[index], titles, rng, args.think, local)
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    steps.extend(local)
+                    sessions.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=user_loop, args=(i,)) for i in range(args.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = {}
+        for name in dict.fromkeys(name for name, _ in steps):
+            results[f"step.{name}"] = summarize([s for n, s in steps if n == name], elapsed)
+        results["session"] = summarize(sessions, elapsed)
+        if args.render:
+            for name, samples in render_samples(args.render, usernames[0]).items():
+                results[name] = summarize(samples)
+        results["errors"] = {"count": len(errors), "first": errors[:5]}
+        results["pool"] = db.get_pool_stats()
+    finally:
+        cleanup(usernames, set(current_catalog().movies["movie_id"].astype(int).tolist()) - movies_before)
+        server.shutdown()
+
+    print_table(results)
+    write_results("sessions", results, args.out, {
+        "users": args.users, "sessions": args.sessions, "think": args.think, "omdb_latency": args.latency,
+        "kdf_iterations": auth.AUTH_KDF_ITERATIONS, "render": args.render,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Each sample runs in a fresh interpreter so nothing is shared between runs
+# except the OS page cache, which is what workers on one host would share too.
+LOAD_SCRIPT = """
+import json, resource, sys, time
+from catalog import load_catalog
+start = time.perf_counter()
+catalog = load_catalog(source=sys.argv[1], similarity_path=sys.argv[2])
+catalog.neighbor_ids[len(catalog.movies) - 1].sum()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def measure(source, similarity_path, repeat):
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", LOAD_SCRIPT, source, similarity_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    seconds = [s["seconds"] for s in samples]
+    return {
+        "source": source,
+        "median_ms": statistics.median(seconds) * 1000,
+        "min_ms": min(seconds) * 1000,
+        "max_rss_mb": max(s["max_rss_kb"] for s in samples) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare catalog startup from pickles and memory-mapped .npy files")
+    parser.add_argument("--similarity", default="similarity.pkl")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sources", nargs="+", default=["pickle", "npy"])
+    args = parser.parse_args()
+
+    for source in args.sources:
+        result = measure(source, args.similarity, args.repeat)
+        print(f"{result['source']:>8}: median {result['median_ms']:8.1f} ms  "
+              f"min {result['min_ms']:8.1f} ms  max RSS {result['max_rss_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
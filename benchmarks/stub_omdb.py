@@ -0,0 +1,58 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Local stand-in for the OMDb API with configurable latency and error rate
+class StubOMDbServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, failure_rate=0.0, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests += 1
+        time.sleep(server.latency)
+        title = parse_qs(urlparse(self.path).query).get("t", [""])[0]
+        if random.random() < server.failure_rate:
+            status, payload = 503, {"Response": "False", "Error": "Service unavailable"}
+        elif title.startswith("missing"):
+            status, payload = 200, {"Response": "False", "Error": "Movie not found!"}
+        else:
+            status, payload = 200, {
+                "Title": title, "Year": "2009", "Genre": "Drama", "imdbRating": "7.0",
+                "Plot": "A stub plot.", "imdbID": "tt0000001", "Poster": "N/A", "Response": "True",
+            }
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
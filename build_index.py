@@ -0,0 +1,95 @@
+import argparse
+import os
+import pickle
+
+import numpy as np
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+DEFAULT_K = 50
+CHUNK_ROWS = 512
+
+
+def top_k_rows(scores, k):
+    # Best k columns of every row, ordered by score (descending) and then by
+    # column, which is the order the old sorted(..., reverse=True) produced.
+    scores = np.atleast_2d(np.asarray(scores))
+    k = min(k, scores.shape[1])
+    ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(scores, ids, axis=1)
+
+    # argpartition picks an arbitrary member of a tie on the k-th score,
+    # a stable sort keeps the lowest columns instead
+    kth = top.min(axis=1, keepdims=True)
+    for r in np.flatnonzero((scores >= kth).sum(axis=1) > k):
+        candidates = np.flatnonzero(scores[r] >= kth[r])
+        ids[r] = candidates[np.lexsort((candidates, -scores[r, candidates]))][:k]
+    top = np.take_along_axis(scores, ids, axis=1)
+
+    order = np.lexsort((ids, -top))
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def build_neighbor_index(similarity, k=DEFAULT_K):
+    # Slot 0 of every row holds the best match, normally the movie itself,
+    # so k neighbors need k + 1 slots
+    n = similarity.shape[0]
+    width = min(k + 1, n)
+    neighbor_ids = np.empty((n, width), dtype=np.int32)
+    neighbor_scores = np.empty((n, width), dtype=np.float32)
+    for start in range(0, n, CHUNK_ROWS):
+        ids, scores = top_k_rows(similarity[start:start + CHUNK_ROWS], width)
+        neighbor_ids[start:start + CHUNK_ROWS] = ids
+        neighbor_scores[start:start + CHUNK_ROWS] = scores
+    return neighbor_ids, neighbor_scores
+
+
+def save_neighbor_index(neighbor_ids, neighbor_scores, artifact_dir=ARTIFACT_DIR):
+    os.makedirs(artifact_dir, exist_ok=True)
+    np.save(os.path.join(artifact_dir, "neighbor_ids.npy"), neighbor_ids)
+    np.save(os.path.join(artifact_dir, "neighbor_scores.npy"), neighbor_scores)
+
+
+def load_neighbor_index(artifact_dir=ARTIFACT_DIR, mmap_mode="r"):
+    neighbor_ids = np.load(os.path.join(artifact_dir, "neighbor_ids.npy"), mmap_mode=mmap_mode)
+    neighbor_scores = np.load(os.path.join(artifact_dir, "neighbor_scores.npy"), mmap_mode=mmap_mode)
+    return neighbor_ids, neighbor_scores
+
+
+# Compare the index with the dense matrix the way recommend() used to rank it
+def verify_neighbor_index(similarity, neighbor_ids, top_n=5):
+    mismatches = []
+    for start in range(0, similarity.shape[0], CHUNK_ROWS):
+        chunk = np.asarray(similarity[start:start + CHUNK_ROWS])
+        expected = np.argsort(-chunk, axis=1, kind="stable")[:, 1:top_n + 1]
+        actual = neighbor_ids[start:start + CHUNK_ROWS, 1:top_n + 1]
+        for offset in np.flatnonzero((expected != actual).any(axis=1)):
+            mismatches.append(start + int(offset))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert similarity.pkl into a top-K neighbor index")
+    parser.add_argument("--similarity", default="similarity.pkl")
+    parser.add_argument("--out", default=ARTIFACT_DIR)
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="neighbors kept per movie")
+    parser.add_argument("--verify", action="store_true", help="check top-5 results against the dense matrix")
+    args = parser.parse_args()
+
+    with open(args.similarity, "rb") as f:
+        similarity = pickle.load(f)
+
+    neighbor_ids, neighbor_scores = build_neighbor_index(similarity, args.k)
+    save_neighbor_index(neighbor_ids, neighbor_scores, args.out)
+    size_mb = (neighbor_ids.nbytes + neighbor_scores.nbytes) / 2 ** 20
+    print(f"Wrote {neighbor_ids.shape[0]} x {args.k} neighbors to {args.out} ({size_mb:.1f} MB)")
+
+    if args.verify:
+        mismatches = verify_neighbor_index(similarity, neighbor_ids)
+        if mismatches:
+            print(f"Top-5 mismatch for {len(mismatches)} rows, first: {mismatches[:10]}")
+            raise SystemExit(1)
+        print("Top-5 results match the dense matrix for every movie")
+
+
+if __name__ == "__main__":
+    main()
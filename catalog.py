@@ -0,0 +1,402 @@
+import argparse
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from build_index import ARTIFACT_DIR, build_neighbor_index, load_neighbor_index
+
+MOVIES_PICKLE = "movies_dict.pkl"
+SIMILARITY_PICKLE = "similarity.pkl"
+# Same keys as the dict returned by omdb.fetch_movie_details
+METADATA_FIELDS = ("poster_url", "title", "year", "genre", "imdb_rating", "plot", "imdb_id")
+
+
+# Variable-length UTF-8 strings as an offsets array plus one byte buffer,
+# both memory-mapped; values are decoded one at a time on access
+class TextColumn:
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        # Indexing a memmap builds a new numpy object each time; memoryviews
+        # over the same pages are several times cheaper
+        self._bytes = memoryview(np.asarray(data))
+        self._offsets = memoryview(np.asarray(offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.raw(row).decode()
+
+    # UTF-8 bytes compare in the same order as the strings they encode
+    def raw(self, row):
+        return self._bytes[self._offsets[row]:self._offsets[row + 1]].tobytes()
+
+    def tolist(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [data[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(*_encode_text(values))
+
+
+def _encode_text(values):
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def save_text_column(out_dir, name, values):
+    offsets, data = _encode_text(values)
+    _save_atomic(os.path.join(out_dir, f"{name}.offsets.npy"), offsets)
+    _save_atomic(os.path.join(out_dir, f"{name}.utf8.npy"), data)
+
+
+def load_text_column(out_dir, name, mmap_mode="r"):
+    return TextColumn(
+        np.load(os.path.join(out_dir, f"{name}.offsets.npy"), mmap_mode=mmap_mode),
+        np.load(os.path.join(out_dir, f"{name}.utf8.npy"), mmap_mode=mmap_mode),
+    )
+
+
+def _save_atomic(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+# OMDb fields baked into the catalog by enrich_catalog.py. fetched_at is 0
+# for rows that have never been looked up; found is False for titles OMDb
+# does not know.
+class MovieMetadata:
+    def __init__(self, fields, found, fetched_at):
+        self.fields = fields
+        self.found = found
+        self.fetched_at = fetched_at
+
+    def details(self, row):
+        if not self.fetched_at[row]:
+            return None
+        details = {name: column[row] for name, column in self.fields.items()}
+        details["poster_url"] = details["poster_url"] or None
+        return details
+
+
+def metadata_dir(artifact_dir=ARTIFACT_DIR):
+    return os.path.join(catalog_dir(artifact_dir), "metadata")
+
+
+def save_metadata(artifact_dir, details, found, fetched_at):
+    out_dir = metadata_dir(artifact_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    for name in METADATA_FIELDS:
+        save_text_column(out_dir, name, [(d or {}).get(name) or "" for d in details])
+    _save_atomic(os.path.join(out_dir, "found.npy"), np.asarray(found, dtype=bool))
+    # Written last: a row only counts as enriched once its fields are on disk
+    _save_atomic(os.path.join(out_dir, "fetched_at.npy"), np.asarray(fetched_at, dtype=np.float64))
+
+
+def load_metadata(artifact_dir=ARTIFACT_DIR, mmap_mode="r"):
+    out_dir = metadata_dir(artifact_dir)
+    if not os.path.exists(os.path.join(out_dir, "fetched_at.npy")):
+        return None
+    return MovieMetadata(
+        {name: load_text_column(out_dir, name, mmap_mode) for name in METADATA_FIELDS},
+        np.load(os.path.join(out_dir, "found.npy"), mmap_mode=mmap_mode),
+        np.load(os.path.join(out_dir, "fetched_at.npy"), mmap_mode=mmap_mode),
+    )
+
+
+# The serving columns: movie ids as an int64 array and titles as a
+# TextColumn, plus the sort orders that row lookups binary-search. Loaded
+# from exported artifacts everything is memory-mapped, so worker processes
+# share it through the page cache instead of each building lookup dicts.
+class MovieColumns:
+    def __init__(self, movie_ids, titles, title_order=None, movie_order=None, sorted_movie_ids=None):
+        self.movie_ids = movie_ids
+        self.titles = titles
+        self.title_order = title_order if title_order is not None else title_sort_order(titles)
+        self.movie_order = movie_order if movie_order is not None else np.argsort(movie_ids, kind="stable")
+        self.sorted_movie_ids = (sorted_movie_ids if sorted_movie_ids is not None
+                                 else np.asarray(movie_ids)[self.movie_order])
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __getitem__(self, name):
+        if name == "movie_id":
+            return self.movie_ids
+        if name == "title":
+            return self.titles
+        raise KeyError(name)
+
+    @property
+    def nbytes(self):
+        return (self.titles.nbytes + sum(array.nbytes for array in (
+            self.movie_ids, self.title_order, self.movie_order, self.sorted_movie_ids)))
+
+    # First row with exactly this title, or -1. The sort is stable, so among
+    # repeated titles the lowest row sorts first.
+    def find_title(self, title):
+        try:
+            key = title.encode()
+        except UnicodeEncodeError:
+            return -1
+        order, raw = memoryview(np.asarray(self.title_order)), self.titles.raw
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if raw(order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return int(order[low]) if low < len(order) and raw(order[low]) == key else -1
+
+    def find_movie_ids(self, movie_ids):
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if not len(self.sorted_movie_ids):
+            return np.full(len(movie_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_movie_ids, movie_ids), len(self.sorted_movie_ids) - 1)
+        found = self.sorted_movie_ids[positions] == movie_ids
+        return np.where(found, self.movie_order[positions], -1).astype(np.int64)
+
+
+def title_sort_order(titles):
+    titles = titles.tolist() if hasattr(titles, "tolist") else list(titles)
+    return np.array(sorted(range(len(titles)), key=titles.__getitem__), dtype=np.int64)
+
+
+class Catalog:
+    def __init__(self, movies, neighbor_ids, neighbor_scores, source, metadata=None, version=None, vectors=None):
+        self.movies = movies
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+        self.source = source
+        self.metadata = metadata
+        self.version = version
+        # L2-normalized sparse term vectors written by pipeline.py, if any
+        self.vectors = vectors
+        # Built on first use by search_index.get_search_index and
+        # neighbors.get_engine
+        self.search_index = None
+        self.engine = None
+        # Seconds spent loading this catalog and building the above
+        self.load_seconds = {}
+
+    # Neighbors stored per movie, not counting slot 0
+    @property
+    def depth(self):
+        return self.neighbor_ids.shape[1] - 1
+
+    # Catalog rows of titles or movie ids, -1 for unknown ones; repeated
+    # titles resolve to their first row
+    def find_rows(self, titles):
+        return np.array([self.movies.find_title(title) for title in titles], dtype=np.int64)
+
+    def find_movie_rows(self, movie_ids):
+        return self.movies.find_movie_ids(movie_ids)
+
+    # Baked OMDb details for a row, or None when it has not been enriched
+    def movie_details(self, row):
+        if self.metadata is None or row >= len(self.metadata.fetched_at):
+            return None
+        return self.metadata.details(row)
+
+
+def catalog_dir(artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, "catalog")
+
+
+# Published artifact sets live in artifact_dir/versions/<version>/ and the
+# CURRENT file names the one being served. A tree without CURRENT is served
+# from artifact_dir itself.
+def current_version(artifact_dir=ARTIFACT_DIR):
+    try:
+        with open(os.path.join(artifact_dir, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(artifact_dir, version):
+    return os.path.join(artifact_dir, "versions", version)
+
+
+def resolve_artifact_dir(artifact_dir=ARTIFACT_DIR):
+    version = current_version(artifact_dir)
+    return version_dir(artifact_dir, version) if version else artifact_dir
+
+
+# Directory to write a new version into; it only becomes visible to servers
+# once publish_version() renames it into place and flips CURRENT
+def new_version_dir(artifact_dir=ARTIFACT_DIR):
+    stamp = time.strftime("%Y%m%d%H%M%S")
+    version, attempt = stamp, 1
+    while os.path.exists(version_dir(artifact_dir, version)):
+        version, attempt = f"{stamp}-{attempt}", attempt + 1
+    staging = os.path.join(artifact_dir, "versions", f".{version}.staging")
+    os.makedirs(staging)
+    return version, staging
+
+
+# Fill a staging directory with hard links to the artifacts of an existing
+# set (copies across filesystems), leaving out the relative paths in skip.
+# Sharing inodes is safe because artifacts are only ever replaced, never
+# rewritten in place.
+def link_artifacts(source_dir, staging, skip=()):
+    skip = {os.path.normpath(path) for path in skip}
+    for root, dirs, files in os.walk(source_dir):
+        relative = os.path.relpath(root, source_dir)
+        dirs[:] = [d for d in dirs if os.path.normpath(os.path.join(relative, d)) not in skip
+                   and not (relative == "." and d == "versions")]
+        os.makedirs(os.path.join(staging, relative), exist_ok=True)
+        for name in files:
+            path = os.path.normpath(os.path.join(relative, name))
+            if path in skip or (relative == "." and name.startswith("CURRENT")):
+                continue
+            try:
+                os.link(os.path.join(root, name), os.path.join(staging, path))
+            except OSError:
+                shutil.copy2(os.path.join(root, name), os.path.join(staging, path))
+
+
+def publish_version(artifact_dir, version, staging, keep=3):
+    os.rename(staging, version_dir(artifact_dir, version))
+    pointer = os.path.join(artifact_dir, "CURRENT.tmp")
+    with open(pointer, "w") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(artifact_dir, "CURRENT"))
+
+    # Servers still mapping an old version keep their open files after removal
+    versions = sorted(v for v in os.listdir(os.path.join(artifact_dir, "versions")) if not v.startswith("."))
+    for old in versions[:-keep]:
+        shutil.rmtree(version_dir(artifact_dir, old), ignore_errors=True)
+
+
+def save_vectors(vectors, vectors_dir):
+    os.makedirs(vectors_dir, exist_ok=True)
+    vectors = vectors.tocsr()
+    np.save(os.path.join(vectors_dir, "data.npy"), vectors.data.astype(np.float32))
+    np.save(os.path.join(vectors_dir, "indices.npy"), vectors.indices.astype(np.int32))
+    # scipy would copy an int64 indptr next to int32 indices on load
+    indptr_dtype = np.int32 if vectors.nnz < 2 ** 31 else np.int64
+    np.save(os.path.join(vectors_dir, "indptr.npy"), vectors.indptr.astype(indptr_dtype))
+    np.save(os.path.join(vectors_dir, "shape.npy"), np.array(vectors.shape, dtype=np.int64))
+
+
+def load_vectors(vectors_dir, mmap_mode="r"):
+    parts = {
+        name: np.load(os.path.join(vectors_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in ("data", "indices", "indptr", "shape")
+    }
+    return sparse.csr_matrix((parts["data"], parts["indices"], parts["indptr"]), shape=tuple(parts["shape"]))
+
+
+# The serving columns as memory-mappable files: movie_id.npy, titles as a
+# text column and the sort orders find_title/find_movie_ids search
+def save_catalog_columns(artifact_dir, movie_ids, titles):
+    out_dir = catalog_dir(artifact_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    movie_order = np.argsort(movie_ids, kind="stable")
+    _save_atomic(os.path.join(out_dir, "movie_id.npy"), movie_ids)
+    _save_atomic(os.path.join(out_dir, "movie_id.order.npy"), movie_order)
+    _save_atomic(os.path.join(out_dir, "movie_id.sorted.npy"), movie_ids[movie_order])
+    save_text_column(out_dir, "title", titles)
+    _save_atomic(os.path.join(out_dir, "title.order.npy"), title_sort_order(titles))
+
+
+def export_catalog(movies_path=MOVIES_PICKLE, artifact_dir=ARTIFACT_DIR):
+    movies = load_movies_pickle(movies_path)
+    save_catalog_columns(artifact_dir, movies["movie_id"], movies["title"].tolist())
+    return len(movies)
+
+
+def _load_optional(path, mmap_mode):
+    return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+
+def load_movies(artifact_dir=ARTIFACT_DIR, mmap_mode="r"):
+    out_dir = catalog_dir(artifact_dir)
+    if os.path.exists(os.path.join(out_dir, "title.utf8.npy")):
+        titles = load_text_column(out_dir, "title", mmap_mode)
+    else:
+        # Fixed-width titles from older exports, converted in memory; export
+        # again to share them between processes
+        titles = TextColumn.from_values(np.load(os.path.join(out_dir, "title.npy")).tolist())
+    return MovieColumns(
+        np.load(os.path.join(out_dir, "movie_id.npy"), mmap_mode=mmap_mode),
+        titles,
+        _load_optional(os.path.join(out_dir, "title.order.npy"), mmap_mode),
+        _load_optional(os.path.join(out_dir, "movie_id.order.npy"), mmap_mode),
+        _load_optional(os.path.join(out_dir, "movie_id.sorted.npy"), mmap_mode),
+    )
+
+
+def load_movies_pickle(movies_path=MOVIES_PICKLE):
+    with open(movies_path, "rb") as f:
+        movies = pd.DataFrame(pickle.load(f))
+    # Row positions are what the neighbor index refers to
+    return MovieColumns(movies["movie_id"].to_numpy(dtype=np.int64),
+                        TextColumn.from_values(movies["title"].tolist()))
+
+
+# source is "npy" (memory-mapped artifacts), "pickle" (movies_dict.pkl and
+# similarity.pkl) or "auto", which prefers each artifact when it exists
+def load_catalog(artifact_dir=ARTIFACT_DIR, source="auto", movies_path=MOVIES_PICKLE,
+                 similarity_path=SIMILARITY_PICKLE):
+    if source not in ("auto", "npy", "pickle"):
+        raise ValueError(f"Unknown catalog source: {source}")
+    version = current_version(artifact_dir)
+    artifact_dir = resolve_artifact_dir(artifact_dir)
+    npy_movies = source == "npy" or (
+        source == "auto" and os.path.exists(os.path.join(catalog_dir(artifact_dir), "movie_id.npy")))
+    npy_neighbors = source == "npy" or (
+        source == "auto" and os.path.exists(os.path.join(artifact_dir, "neighbor_ids.npy")))
+
+    movies = load_movies(artifact_dir) if npy_movies else load_movies_pickle(movies_path)
+    if npy_neighbors:
+        neighbor_ids, neighbor_scores = load_neighbor_index(artifact_dir)
+    else:
+        with open(similarity_path, "rb") as f:
+            neighbor_ids, neighbor_scores = build_neighbor_index(pickle.load(f))
+
+    if npy_movies and npy_neighbors:
+        source = "npy"
+    elif npy_movies or npy_neighbors:
+        source = "mixed"
+    else:
+        source = "pickle"
+    metadata = load_metadata(artifact_dir) if npy_movies else None
+    vectors_dir = os.path.join(artifact_dir, "vectors")
+    vectors = load_vectors(vectors_dir) if npy_movies and os.path.exists(vectors_dir) else None
+    return Catalog(movies, neighbor_ids, neighbor_scores, source, metadata, version, vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export movies_dict.pkl as memory-mappable catalog columns")
+    parser.add_argument("--movies", default=MOVIES_PICKLE)
+    parser.add_argument("--out", default=ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    count = export_catalog(args.movies, args.out)
+    print(f"Wrote {count} movies to {catalog_dir(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
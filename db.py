@@ -1,6 +1,12 @@
 import psycopg2
+from psycopg2 import extensions, pool
 from dotenv import load_dotenv
+from contextlib import contextmanager
 import os
+import threading
+import time
+
+from metrics import record, register_gauges, timed
 
 load_dotenv()
 
@@ -8,6 +14,13 @@ DB_HOST = os.getenv("DB_HOST")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
+# psycopg2 opens DB_POOL_MIN connections up front and keeps that many idle;
+# connections above it are opened on demand and closed when returned
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 4))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+# Connections idle for longer than this are pinged before being handed out
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", 30))
 
 
 def connect_to_postgresql():
@@ -19,66 +32,223 @@ def connect_to_postgresql():
     )
 
 
-def create_tables():
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password_hash VARCHAR(256) NOT NULL,
-            role VARCHAR(10) NOT NULL
-        );
-    ''')
-    cursor.execute('''
-            CREATE TABLE IF NOT EXISTS watchlist (
-                id SERIAL PRIMARY KEY, 
-                username VARCHAR(50) NOT NULL, 
-                movie_name TEXT NOT NULL,
-                poster_url TEXT,
-                genre VARCHAR(50),
-                year INTEGER,
-                imdb_rating FLOAT
-            );
-        ''')
-    conn.commit()
-    conn.close()
-
-
-# Add a movie to the watchlist
-def add_to_watchlist(username, movie_name, poster_url, genre, year, imdb_rating):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO watchlist (username, movie_name, poster_url, genre, year, imdb_rating) VALUES (%s, %s, %s, %s, %s, %s)",
-        (username, movie_name, poster_url, genre, year, imdb_rating)
-    )
-    conn.commit()
-    conn.close()
+# Pooled connections remember when they were last handed back, so the
+# timestamp goes away with the connection
+class PooledConnection(extensions.connection):
+    last_used = 0.0
+
+
+# Process-wide connection pool. ThreadedConnectionPool fails immediately when
+# it is exhausted, so checkouts first wait for one of DB_POOL_MAX slots.
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_pool_stats_lock = threading.Lock()
+pool_stats = {"checkouts": 0, "in_use": 0, "discarded": 0, "timeouts": 0, "wait_seconds": 0.0}
+
+
+def _count(name, value=1):
+    with _pool_stats_lock:
+        pool_stats[name] += value
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, connection_factory=PooledConnection,
+                    host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - conn.last_used < DB_POOL_CHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    started = time.perf_counter()
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        _count("timeouts")
+        raise pool.PoolError(f"No database connection available after {DB_POOL_TIMEOUT}s")
+    try:
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        while not _is_healthy(conn):
+            _count("discarded")
+            db_pool.putconn(conn, close=True)
+            conn = db_pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+    waited = time.perf_counter() - started
+    record("db.checkout", waited)
+    _count("wait_seconds", waited)
+    _count("checkouts")
+    _count("in_use")
+    return conn
+
+
+def _checkin(conn, close=False):
+    close = close or bool(conn.closed)
+    if not close:
+        conn.last_used = time.monotonic()
+    try:
+        get_pool().putconn(conn, close=close)
+    finally:
+        _count("in_use", -1)
+        _pool_slots.release()
+
+
+# Borrow a pooled connection; commits on success, rolls back on error and
+# always hands the connection back
+@contextmanager
+def get_connection():
+    conn = _checkout()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception as e:
+        if not conn.closed:
+            conn.rollback()
+        broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        raise
+    finally:
+        _checkin(conn, close=broken)
+
+
+@contextmanager
+def get_cursor():
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            yield cursor
+
+
+def get_pool_stats():
+    with _pool_stats_lock:
+        stats = dict(pool_stats)
+    stats["max_size"] = DB_POOL_MAX
+    stats["min_size"] = DB_POOL_MIN
+    stats["idle"] = len(_pool._pool) if _pool is not None else 0
+    return stats
+
+
+register_gauges("db_pool", get_pool_stats)
+
+
+# OMDb reports missing values as "N/A" and series years as "2008–2013"
+def _to_int(value):
+    try:
+        return int(str(value)[:4])
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+        return value if value == value else None  # NaN from pandas
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_text(value):
+    return value if isinstance(value, str) and value not in ("", "N/A") else None
+
+
+# Callbacks run with a username after that user's watchlist changed
+_watchlist_listeners = []
+
+
+def on_watchlist_change(callback):
+    _watchlist_listeners.append(callback)
+    return callback
+
+
+def _watchlist_changed(username):
+    for callback in _watchlist_listeners:
+        callback(username)
+
+
+# Add a movie to the watchlist. Saving the same movie twice, even from two
+# sessions at once, is a no-op; returns whether a new row was added. The
+# movies row is shared by every watchlist, so missing values (None, "N/A")
+# never overwrite ones already stored.
+@timed("db.add_to_watchlist")
+def add_to_watchlist(username, movie_id, movie_name, poster_url, genre, year, imdb_rating):
+    with get_cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO movies (movie_id, title, poster_url, genre, year, imdb_rating) VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (movie_id) DO UPDATE SET poster_url = COALESCE(EXCLUDED.poster_url, movies.poster_url), "
+            "genre = COALESCE(EXCLUDED.genre, movies.genre), year = COALESCE(EXCLUDED.year, movies.year), "
+            "imdb_rating = COALESCE(EXCLUDED.imdb_rating, movies.imdb_rating)",
+            (movie_id, movie_name, _to_text(poster_url), _to_text(genre), _to_int(year), _to_float(imdb_rating))
+        )
+        cursor.execute(
+            "INSERT INTO watchlist (user_id, movie_id) SELECT id, %s FROM users WHERE username = %s "
+            "ON CONFLICT (user_id, movie_id) DO NOTHING",
+            (movie_id, username)
+        )
+        added = cursor.rowcount == 1
+    if added:
+        _watchlist_changed(username)
+    return added
 
 
 # Remove a movie from the watchlist
-def remove_from_watchlist(username, movie_name):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    cursor.execute(
-        "DELETE FROM watchlist WHERE username = %s AND movie_name = %s",
-        (username, movie_name)
-    )
-    conn.commit()
-    conn.close()
+@timed("db.remove_from_watchlist")
+def remove_from_watchlist(username, movie_id):
+    with get_cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM watchlist w USING users u WHERE u.id = w.user_id AND u.username = %s AND w.movie_id = %s",
+            (username, movie_id)
+        )
+    _watchlist_changed(username)
 
 
 # Fetch movies from the watchlist of a specific user
+@timed("db.get_watchlist")
 def get_watchlist(username):
-    conn = connect_to_postgresql()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, username, movie_name, poster_url, genre, year, imdb_rating FROM watchlist WHERE username = %s",
-        (username,)
-    )
-    watchlist = cursor.fetchall()
-    conn.commit()
-    conn.close()
-    return watchlist
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT m.movie_id, m.title, m.poster_url, m.genre, m.year, m.imdb_rating "
+            "FROM watchlist w "
+            "JOIN users u ON u.id = w.user_id "
+            "JOIN movies m ON m.movie_id = w.movie_id "
+            "WHERE u.username = %s "
+            "ORDER BY w.added_at",
+            (username,)
+        )
+        return cursor.fetchall()
+
 
+# Catalog ids of the movies on a user's watchlist
+@timed("db.get_watchlist_movie_ids")
+def get_watchlist_movie_ids(username):
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT w.movie_id FROM watchlist w JOIN users u ON u.id = w.user_id WHERE u.username = %s",
+            (username,)
+        )
+        return [movie_id for movie_id, in cursor.fetchall()]
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from build_index import ARTIFACT_DIR
+from catalog import (
+    METADATA_FIELDS, current_version, link_artifacts, load_metadata, load_movies, metadata_dir, new_version_dir,
+    publish_version, resolve_artifact_dir, save_metadata,
+)
+import omdb
+
+# Kept next to CURRENT and keyed by movie id, so it survives the versions
+# published while enriching
+CHECKPOINT_NAME = "enrichment.jsonl"
+
+
+# Spaces request start times at least 1 / rate seconds apart across threads
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Metadata of the served version with the rows an interrupted run had
+# finished applied; also returns how many of those there were
+def _current_state(base_dir, checkpoint_path, movie_ids):
+    count = len(movie_ids)
+    details, found, fetched_at = [None] * count, [False] * count, [0.0] * count
+    metadata = load_metadata(base_dir)
+    if metadata is not None:
+        for row in range(min(count, len(metadata.fetched_at))):
+            details[row] = metadata.details(row)
+            found[row] = bool(metadata.found[row])
+            fetched_at[row] = float(metadata.fetched_at[row])
+
+    resumed = 0
+    if os.path.exists(checkpoint_path):
+        row_of = {movie_id: row for row, movie_id in enumerate(movie_ids)}
+        with open(checkpoint_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    row = row_of.get(entry["movie_id"])
+                except (ValueError, KeyError):
+                    continue  # partially written last line, or an older format
+                if row is not None:
+                    details[row] = entry["details"]
+                    found[row] = entry["found"]
+                    fetched_at[row] = entry["fetched_at"]
+                    resumed += 1
+    return details, found, fetched_at, resumed
+
+
+def _lookup(title, limiter):
+    limiter.wait()
+    movie_data = omdb.request_movie_data(title)
+    found = movie_data.get('Response') != 'False'
+    details = omdb.parse_movie_details(movie_data) if found else omdb.placeholder_details(title)
+    omdb.metadata_cache.set(title, details, found=found)
+    return details, found
+
+
+class VersionChangedError(Exception):
+    pass
+
+
+# The enriched metadata goes into a new version that links every other
+# artifact of the one it was based on; servers swap it in like any other
+# published version. Returns the new version.
+def _publish(artifact_dir, base_version, base_dir, details, found, fetched_at):
+    if current_version(artifact_dir) != base_version:
+        raise VersionChangedError(
+            f"Version {current_version(artifact_dir)} was published while enriching {base_version}; "
+            "run enrich_catalog.py again to resume from the checkpoint")
+    version, staging = new_version_dir(artifact_dir)
+    link_artifacts(base_dir, staging, skip=[os.path.relpath(metadata_dir(base_dir), base_dir), CHECKPOINT_NAME])
+    save_metadata(staging, details, found, fetched_at)
+    publish_version(artifact_dir, version, staging)
+    return version
+
+
+def enrich(artifact_dir=ARTIFACT_DIR, max_age_days=30, rate=5.0, workers=4, publish_every=0, limit=None):
+    base_version = current_version(artifact_dir)
+    base_dir = resolve_artifact_dir(artifact_dir)
+    movies = load_movies(base_dir)
+    titles = movies["title"].tolist()
+    movie_ids = movies["movie_id"].astype(int).tolist()
+    checkpoint_path = os.path.join(artifact_dir, CHECKPOINT_NAME)
+    details, found, fetched_at, resumed = _current_state(base_dir, checkpoint_path, movie_ids)
+
+    stale_before = time.time() - max_age_days * 24 * 3600
+    todo = [row for row in range(len(titles)) if fetched_at[row] < stale_before]
+    if limit is not None:
+        todo = todo[:limit]
+
+    limiter = RateLimiter(rate)
+    failed = 0
+    done = 0
+    with open(checkpoint_path, "a") as checkpoint, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_lookup, titles[row], limiter): row for row in todo}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                details[row], found[row] = future.result()
+            except (omdb.OMDbError, ValueError, OSError) as e:
+                failed += 1
+                print(f"Lookup failed for {titles[row]!r}: {e}")
+                continue
+            fetched_at[row] = time.time()
+            checkpoint.write(json.dumps({
+                "movie_id": movie_ids[row], "details": details[row], "found": found[row],
+                "fetched_at": fetched_at[row],
+            }) + "\n")
+            checkpoint.flush()
+            done += 1
+            if publish_every and done % publish_every == 0:
+                base_version = _publish(artifact_dir, base_version, base_dir, details, found, fetched_at)
+                base_dir = resolve_artifact_dir(artifact_dir)
+                print(f"{done}/{len(todo)} rows enriched, published version {base_version}")
+
+    # The checkpoint only goes once everything in it is in a published
+    # version, including rows a previous run finished
+    if done or resumed:
+        base_version = _publish(artifact_dir, base_version, base_dir, details, found, fetched_at)
+        print(f"Published version {base_version}")
+    os.remove(checkpoint_path)
+    return done, failed, len(titles) - sum(1 for t in fetched_at if t)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Bake OMDb fields ({', '.join(METADATA_FIELDS)}) into the catalog")
+    parser.add_argument("--artifacts", default=ARTIFACT_DIR)
+    parser.add_argument("--max-age-days", type=float, default=30, help="refresh rows fetched longer ago than this")
+    parser.add_argument("--rate", type=float, default=5.0, help="OMDb requests per second")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--publish-every", type=int, default=0,
+                        help="also publish a version after this many rows (0: only at the end)")
+    parser.add_argument("--limit", type=int, help="enrich at most this many rows")
+    args = parser.parse_args()
+
+    done, failed, missing = enrich(args.artifacts, args.max_age_days, args.rate, args.workers,
+                                   args.publish_every, args.limit)
+    print(f"Enriched {done} rows, {failed} failed, {missing} rows still without metadata")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PATH = os.getenv("OMDB_CACHE_PATH", os.path.join(".cache", "omdb.sqlite3"))
+CACHE_TTL = int(os.getenv("OMDB_CACHE_TTL", 7 * 24 * 3600))
+NEGATIVE_TTL = int(os.getenv("OMDB_NEGATIVE_TTL", 24 * 3600))
+MEMORY_SIZE = int(os.getenv("OMDB_CACHE_SIZE", 2048))
+
+
+def cache_key(title):
+    return " ".join(title.split()).casefold()
+
+
+# Two-level cache for OMDb lookups: an in-process LRU in front of a SQLite
+# file shared by every worker on the host. "Movie not found" answers are
+# cached too, with a shorter TTL.
+class MetadataCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL, memory_size=MEMORY_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "negative_hits": 0, "misses": 0, "expired": 0}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection()
+
+    # sqlite3 connections cannot be shared between threads
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS movie_details ("
+                " key TEXT PRIMARY KEY, details TEXT NOT NULL, found INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, title):
+        key = cache_key(title)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[2] <= now:
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            self._count("memory_hits" if entry[1] else "negative_hits")
+            return dict(entry[0])
+
+        row = self._connection().execute(
+            "SELECT details, found, expires_at FROM movie_details WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        if row[2] <= now:
+            self._count("expired")
+            self._count("misses")
+            return None
+        entry = (json.loads(row[0]), bool(row[1]), row[2])
+        self._remember(key, entry)
+        self._count("disk_hits" if entry[1] else "negative_hits")
+        return dict(entry[0])
+
+    def set(self, title, details, found=True):
+        key = cache_key(title)
+        expires_at = time.time() + (self.ttl if found else self.negative_ttl)
+        entry = (dict(details), found, expires_at)
+        self._remember(key, entry)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO movie_details (key, details, found, expires_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(details), int(found), expires_at),
+        )
+
+    def purge_expired(self):
+        return self._connection().execute("DELETE FROM movie_details WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self._connection().execute("DELETE FROM movie_details")
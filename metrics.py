@@ -0,0 +1,264 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from paths import PACKAGE_DIR
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False")
+# Percentiles are taken over the most recent samples of each span
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 1024))
+# Local endpoint for the Streamlit process; the API serves /metrics itself
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PROFILE = os.getenv("METRICS_PROFILE", "0") not in ("0", "false", "False")
+METRICS_PROFILE_INTERVAL = float(os.getenv("METRICS_PROFILE_INTERVAL", 0.01))
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Span:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=METRICS_WINDOW)
+
+
+_spans = {}
+_spans_lock = threading.Lock()
+# name -> function returning a dict of numbers, read when metrics are exported
+_gauges = {}
+
+
+def record(name, seconds, error=False):
+    with _spans_lock:
+        span = _spans.get(name)
+        if span is None:
+            span = _spans[name] = Span()
+        span.count += 1
+        span.errors += error
+        span.total += seconds
+        span.max = max(span.max, seconds)
+        span.recent.append(seconds)
+
+
+# Times the block under `name`. Exceptions count as errors; Streamlit's
+# rerun/stop signals are BaseExceptions and do not.
+@contextmanager
+def span(name):
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - started, error)
+
+
+def timed(name):
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_gauges(name, collect):
+    _gauges[name] = collect
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+# Count, errors and latency percentiles (seconds) of every span so far
+def span_summary():
+    with _spans_lock:
+        spans = {name: (span.count, span.errors, span.total, span.max, sorted(span.recent))
+                 for name, span in _spans.items()}
+    summary = {}
+    for name, (count, errors, total, longest, ordered) in sorted(spans.items()):
+        summary[name] = {
+            "count": count, "errors": errors, "sum": total, "max": longest,
+            "quantiles": {q: _percentile(ordered, q) for q in QUANTILES} if ordered else {},
+        }
+    return summary
+
+
+def gauge_values():
+    values = {}
+    for name, collect in _gauges.items():
+        try:
+            values[name] = {key: value for key, value in collect().items()
+                            if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        except Exception:
+            continue  # a broken collector must not take the endpoint down
+    return values
+
+
+def reset():
+    with _spans_lock:
+        _spans.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Prometheus text exposition format
+def prometheus_text():
+    lines = [
+        "# HELP recommender_span_seconds Latency of instrumented calls; quantiles over recent samples",
+        "# TYPE recommender_span_seconds summary",
+    ]
+    summary = span_summary()
+    for name, stats in summary.items():
+        label = f'span="{_label(name)}"'
+        for q, value in stats["quantiles"].items():
+            lines.append(f'recommender_span_seconds{{{label},quantile="{q}"}} {value:.6f}')
+        lines.append(f"recommender_span_seconds_sum{{{label}}} {stats['sum']:.6f}")
+        lines.append(f"recommender_span_seconds_count{{{label}}} {stats['count']}")
+    lines += ["# HELP recommender_span_errors_total Instrumented calls that raised",
+              "# TYPE recommender_span_errors_total counter"]
+    lines += [f'recommender_span_errors_total{{span="{_label(name)}"}} {stats["errors"]}'
+              for name, stats in summary.items()]
+    for group, values in gauge_values().items():
+        lines += [f"# TYPE recommender_{group} gauge"]
+        lines += [f'recommender_{group}{{stat="{_label(key)}"}} {value}' for key, value in values.items()]
+    return "\n".join(lines) + "\n"
+
+
+# Wall-clock sampling profiler: every interval it records the stack of each
+# thread that is running code from this package (idle pool workers and the
+# server loops are skipped). Stacks are kept in the folded format
+# flamegraph tools read.
+class SamplingProfiler:
+    MAX_STACKS = 20000
+
+    def __init__(self, interval=METRICS_PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def clear(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                ours = False
+                while frame is not None:
+                    code = frame.f_code
+                    ours = ours or code.co_filename.startswith(PACKAGE_DIR)
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if not ours:
+                    continue
+                folded = ";".join(reversed(stack))
+                with self._lock:
+                    self.samples += 1
+                    if folded in self.stacks or len(self.stacks) < self.MAX_STACKS:
+                        self.stacks[folded] += 1
+
+    def folded(self):
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    # Functions by the share of samples they were on the stack (inclusive)
+    # and at the top of it (self)
+    def top(self, limit=20):
+        inclusive = Counter()
+        own = Counter()
+        with self._lock:
+            samples = self.samples
+            for stack, count in self.stacks.items():
+                frames = stack.split(";")
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+        return [
+            {"function": name, "self": own[name] / samples, "inclusive": inclusive[name] / samples}
+            for name, _ in own.most_common(limit)
+        ] if samples else []
+
+
+profiler = SamplingProfiler()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/profile":
+            body, content_type = profiler.folded(), "text/plain"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+# Starts the profiler when METRICS_PROFILE is set and, given a port, serves
+# /metrics and /profile from a background thread. Safe to call repeatedly.
+def start(port=METRICS_PORT):
+    global _server
+    if METRICS_PROFILE:
+        profiler.start()
+    if not port:
+        return
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((METRICS_HOST, port), _Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
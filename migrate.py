@@ -0,0 +1,114 @@
+import argparse
+import importlib.util
+import os
+import re
+import threading
+
+from db import get_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+# Any constant works, it only has to be the same for every process
+MIGRATION_LOCK_ID = 724_001
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+
+_applied = False
+_applied_lock = threading.Lock()
+
+
+def list_migrations(migrations_dir=MIGRATIONS_DIR):
+    migrations = []
+    for name in sorted(os.listdir(migrations_dir)):
+        match = re.match(r"(\d+)_(\w+)\.(sql|py)$", name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(migrations_dir, name)))
+    return migrations
+
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    ''')
+
+
+def applied_versions():
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            _ensure_version_table(cursor)
+            cursor.execute("SELECT version FROM schema_version")
+            return {row[0] for row in cursor.fetchall()}
+
+
+# .sql files are executed as-is; .py files define upgrade(cursor) for steps
+# that need data from outside the database
+def _run_migration(cursor, path):
+    if path.endswith(".py"):
+        spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+    else:
+        with open(path) as f:
+            cursor.execute(f.read())
+
+
+# Apply pending migrations, each in its own transaction. The advisory lock
+# makes concurrent workers wait instead of racing on the same DDL.
+def apply_migrations(migrations_dir=MIGRATIONS_DIR):
+    applied = []
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                _ensure_version_table(cursor)
+                conn.commit()
+                cursor.execute("SELECT version FROM schema_version")
+                done = {row[0] for row in cursor.fetchall()}
+                for version, name, path in list_migrations(migrations_dir):
+                    if version in done:
+                        continue
+                    _run_migration(cursor, path)
+                    cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                    conn.commit()
+                    applied.append((version, name))
+            finally:
+                conn.rollback()
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    return applied
+
+
+# Called from the app: migrates at most once per process, and not at all when
+# DB_AUTO_MIGRATE=0 because deploys run `python migrate.py` instead
+def ensure_schema():
+    global _applied
+    if _applied or not AUTO_MIGRATE:
+        return
+    with _applied_lock:
+        if not _applied:
+            apply_migrations()
+            _applied = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        done = applied_versions()
+        for version, name, _ in list_migrations():
+            print(f"{version:04d} {name}: {'applied' if version in done else 'pending'}")
+        return
+
+    applied = apply_migrations()
+    for version, name in applied:
+        print(f"Applied {version:04d} {name}")
+    if not applied:
+        print("Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+-- Tables previously created by db.create_tables()
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password_hash VARCHAR(256) NOT NULL,
+    role VARCHAR(10) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS watchlist (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    movie_name TEXT NOT NULL,
+    poster_url TEXT,
+    genre VARCHAR(50),
+    year INTEGER,
+    imdb_rating FLOAT
+);
@@ -0,0 +1,7 @@
+-- Keep the oldest copy of any movie saved twice before adding the constraint
+DELETE FROM watchlist a
+USING watchlist b
+WHERE a.username = b.username AND a.movie_name = b.movie_name AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS watchlist_username_movie_name_key ON watchlist (username, movie_name);
+CREATE INDEX IF NOT EXISTS watchlist_username_idx ON watchlist (username);
@@ -0,0 +1,20 @@
+-- Movie metadata is stored once per TMDB id; the watchlist only links users
+-- to movies. The old denormalized table is kept as watchlist_legacy until
+-- 0004 has copied its rows.
+CREATE TABLE IF NOT EXISTS movies (
+    movie_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    poster_url TEXT,
+    genre TEXT,
+    year INTEGER,
+    imdb_rating REAL
+);
+
+ALTER TABLE watchlist RENAME TO watchlist_legacy;
+
+CREATE TABLE watchlist (
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    movie_id INTEGER NOT NULL REFERENCES movies (movie_id),
+    added_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, movie_id)
+);
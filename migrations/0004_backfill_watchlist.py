@@ -0,0 +1,62 @@
+import os
+
+from psycopg2.extras import execute_values
+
+from build_index import ARTIFACT_DIR
+from catalog import catalog_dir, load_movies, load_movies_pickle, resolve_artifact_dir
+
+
+# Seed movies from the catalog and move legacy watchlist rows over by title.
+# A repeated title resolves to its first catalog row, as the app does, so
+# each legacy row becomes one watchlist entry. Rows whose title is not in
+# the catalog stay in watchlist_legacy.
+def upgrade(cursor):
+    artifact_dir = resolve_artifact_dir(ARTIFACT_DIR)
+    if os.path.exists(os.path.join(catalog_dir(artifact_dir), "movie_id.npy")):
+        movies = load_movies(artifact_dir)
+    else:
+        movies = load_movies_pickle()
+    rows = list(zip(movies["movie_id"].astype(int).tolist(), movies["title"].tolist()))
+    execute_values(
+        cursor,
+        "INSERT INTO movies (movie_id, title) VALUES %s ON CONFLICT (movie_id) DO NOTHING",
+        rows,
+        page_size=1000,
+    )
+
+    cursor.execute("SELECT DISTINCT movie_name FROM watchlist_legacy")
+    resolved = []
+    for name, in cursor.fetchall():
+        row = movies.find_title(name)
+        if row >= 0:
+            resolved.append((name, int(movies["movie_id"][row])))
+    cursor.execute(
+        "CREATE TEMPORARY TABLE legacy_titles (movie_name TEXT PRIMARY KEY, movie_id INTEGER NOT NULL) "
+        "ON COMMIT DROP"
+    )
+    execute_values(cursor, "INSERT INTO legacy_titles (movie_name, movie_id) VALUES %s", resolved, page_size=1000)
+
+    cursor.execute('''
+        UPDATE movies m
+        SET poster_url = l.poster_url, genre = l.genre, year = l.year, imdb_rating = l.imdb_rating
+        FROM (
+            SELECT DISTINCT ON (movie_name) movie_name, poster_url, genre, year, imdb_rating
+            FROM watchlist_legacy
+            ORDER BY movie_name, id DESC
+        ) l
+        JOIN legacy_titles t ON t.movie_name = l.movie_name
+        WHERE m.movie_id = t.movie_id
+    ''')
+    cursor.execute('''
+        INSERT INTO watchlist (user_id, movie_id)
+        SELECT DISTINCT u.id, t.movie_id
+        FROM watchlist_legacy l
+        JOIN users u ON u.username = l.username
+        JOIN legacy_titles t ON t.movie_name = l.movie_name
+        ON CONFLICT DO NOTHING
+    ''')
+    cursor.execute('''
+        DELETE FROM watchlist_legacy l
+        USING users u, legacy_titles t
+        WHERE u.username = l.username AND t.movie_name = l.movie_name
+    ''')
@@ -0,0 +1,5 @@
+-- The admin user list pages through users in byte order of username,
+-- optionally within one role and under a username prefix. Both indexes use
+-- the "C" collation so the same index serves the prefix LIKE and the keyset.
+CREATE INDEX IF NOT EXISTS users_username_c_idx ON users ((username COLLATE "C"));
+CREATE INDEX IF NOT EXISTS users_role_username_c_idx ON users (role, (username COLLATE "C"));
@@ -0,0 +1,176 @@
+import os
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from build_index import top_k_rows
+
+NEIGHBOR_ENGINE = os.getenv("NEIGHBOR_ENGINE", "index")
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0)) or None
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+IVF_DIM = int(os.getenv("IVF_DIM", 128))
+IVF_RERANK = int(os.getenv("IVF_RERANK", 16))
+# Query rows scored against the whole catalog at once by the exact engine
+EXACT_BLOCK_ROWS = 256
+
+
+# Every engine ranks like the neighbor index does: search_rows(rows, n)
+# returns the best n (ids, scores) per query row, slot 0 normally being the
+# movie itself. search_vectors() takes L2-normalized query vectors instead.
+
+
+# Precomputed top-K lists from build_index.py / pipeline.py. Deeper queries
+# and arbitrary vectors go to the exact engine when vectors are available.
+class IndexEngine:
+    name = "index"
+
+    def __init__(self, neighbor_ids, neighbor_scores, vectors=None):
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+        self.exact = ExactEngine(vectors) if vectors is not None else None
+
+    def search_rows(self, rows, n):
+        if n > self.neighbor_ids.shape[1] and self.exact is not None:
+            return self.exact.search_rows(rows, n)
+        return self.neighbor_ids[rows, :n], self.neighbor_scores[rows, :n]
+
+    def search_vectors(self, queries, n):
+        if self.exact is None:
+            raise ValueError("Searching by vector needs the vectors written by pipeline.py")
+        return self.exact.search_vectors(queries, n)
+
+
+# Brute force over the sparse vectors: the reference the others are measured
+# against
+class ExactEngine:
+    name = "exact"
+
+    def __init__(self, vectors):
+        self.vectors = vectors.tocsr()
+
+    def search_vectors(self, queries, n):
+        n = min(n, self.vectors.shape[0])
+        ids, scores = [], []
+        for start in range(0, queries.shape[0], EXACT_BLOCK_ROWS):
+            block = queries[start:start + EXACT_BLOCK_ROWS]
+            block_scores = self.vectors @ block.T
+            block_scores = block_scores.toarray() if sparse.issparse(block_scores) else np.asarray(block_scores)
+            block_ids, block_top = top_k_rows(block_scores.T, n)
+            ids.append(block_ids)
+            scores.append(block_top)
+        if not ids:
+            return np.empty((0, n), dtype=np.int64), np.empty((0, n), dtype=np.float32)
+        return np.concatenate(ids), np.concatenate(scores)
+
+    def search_rows(self, rows, n):
+        return self.search_vectors(self.vectors[rows], n)
+
+
+def _normalize_dense(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+# Inverted-file index over a random projection of the sparse vectors:
+# k-means partitions the reduced vectors into nlist cells, a query scans the
+# nprobe closest cells, shortlists n * rerank candidates on the reduced
+# vectors and ranks the shortlist exactly. Higher nprobe, dim or rerank buy
+# recall with latency.
+class IVFEngine:
+    name = "ivf"
+
+    def __init__(self, vectors, nlist=IVF_NLIST, nprobe=IVF_NPROBE, dim=IVF_DIM, rerank=IVF_RERANK,
+                 iterations=10, train_size=50000, seed=0):
+        rng = np.random.default_rng(seed)
+        self.vectors = vectors.tocsr()
+        count = self.vectors.shape[0]
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.projection = (rng.standard_normal((self.vectors.shape[1], dim)) / np.sqrt(dim)).astype(np.float32)
+        self.reduced = self._reduce(self.vectors)
+
+        nlist = min(nlist or max(1, int(2 * np.sqrt(count))), count)
+        sample = self.reduced[rng.choice(count, min(count, train_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = self._nearest_cell(sample, centroids)
+            members = sparse.csr_matrix(
+                (np.ones(len(sample), dtype=np.float32), (assignment, np.arange(len(sample)))),
+                shape=(nlist, len(sample)),
+            )
+            sums = np.asarray(members @ sample)
+            filled = np.asarray(members.sum(axis=1)).ravel() > 0
+            centroids[filled] = _normalize_dense(sums[filled])
+        self.centroids = centroids
+
+        assignment = self._nearest_cell(self.reduced, centroids)
+        self.cell_members = np.argsort(assignment, kind="stable").astype(np.int32)
+        self.cell_offsets = np.searchsorted(assignment[self.cell_members], np.arange(nlist + 1))
+
+    def _reduce(self, vectors):
+        reduced = vectors @ self.projection
+        return _normalize_dense(np.asarray(reduced, dtype=np.float32))
+
+    @staticmethod
+    def _nearest_cell(points, centroids, block=8192):
+        return np.concatenate([
+            np.argmax(points[start:start + block] @ centroids.T, axis=1)
+            for start in range(0, len(points), block)
+        ]) if len(points) else np.empty(0, dtype=np.int64)
+
+    def search_vectors(self, queries, n):
+        queries = sparse.csr_matrix(queries)
+        n = min(n, self.vectors.shape[0])
+        reduced = self._reduce(queries)
+        nprobe = min(self.nprobe, len(self.centroids))
+        cells = np.argpartition(-(reduced @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        ids = np.full((queries.shape[0], n), -1, dtype=np.int64)
+        scores = np.full((queries.shape[0], n), -np.inf, dtype=np.float32)
+        for i in range(queries.shape[0]):
+            candidates = np.concatenate([
+                self.cell_members[self.cell_offsets[cell]:self.cell_offsets[cell + 1]] for cell in cells[i]
+            ])
+            shortlist = min(len(candidates), n * self.rerank)
+            if shortlist == 0:
+                continue
+            approx = self.reduced[candidates] @ reduced[i]
+            # Sorted so ties break on the lower id, as in the other engines
+            candidates = np.sort(candidates[np.argpartition(-approx, shortlist - 1)[:shortlist]])
+            exact = (self.vectors[candidates] @ queries[i].T).toarray().ravel()
+            order, top = top_k_rows(exact[None, :], min(n, shortlist))
+            ids[i, :order.shape[1]] = candidates[order[0]]
+            scores[i, :order.shape[1]] = top[0]
+        return ids, scores
+
+    def search_rows(self, rows, n):
+        return self.search_vectors(self.vectors[rows], n)
+
+
+ENGINES = ("index", "exact", "ivf")
+_engine_lock = threading.Lock()
+
+
+def build_engine(catalog, name=NEIGHBOR_ENGINE, **options):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown neighbor engine: {name}")
+    # Catalogs without vectors (pickles, converted similarity.pkl) only have
+    # the precomputed lists
+    if name == "index" or catalog.vectors is None:
+        return IndexEngine(catalog.neighbor_ids, catalog.neighbor_scores, catalog.vectors)
+    if name == "exact":
+        return ExactEngine(catalog.vectors)
+    return IVFEngine(catalog.vectors, **options)
+
+
+# One engine per catalog, built on first use
+def get_engine(catalog):
+    engine = catalog.engine
+    if engine is None:
+        with _engine_lock:
+            engine = catalog.engine
+            if engine is None:
+                engine = catalog.engine = build_engine(catalog)
+    return engine
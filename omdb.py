@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from metadata_cache import MetadataCache
+from metrics import register_gauges, timed
+
+load_dotenv()
+
+OMDB_API_KEY = os.getenv("OMDB_API_KEY")
+OMDB_URL = os.getenv("OMDB_URL", "http://www.omdbapi.com/")
+OMDB_TIMEOUT = float(os.getenv("OMDB_TIMEOUT", 5))
+OMDB_RETRIES = int(os.getenv("OMDB_RETRIES", 2))
+OMDB_BACKOFF = float(os.getenv("OMDB_BACKOFF", 0.2))
+OMDB_CONCURRENCY = int(os.getenv("OMDB_CONCURRENCY", 8))
+
+# OMDb responses, shared by every session in this process and on disk
+metadata_cache = MetadataCache()
+register_gauges("omdb_cache", lambda: dict(metadata_cache.stats))
+
+# One keep-alive connection pool and one concurrency limit for the process,
+# however many pages are rendering at once
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=OMDB_CONCURRENCY))
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=OMDB_CONCURRENCY))
+_request_slots = threading.BoundedSemaphore(OMDB_CONCURRENCY)
+_executor = ThreadPoolExecutor(max_workers=OMDB_CONCURRENCY, thread_name_prefix="omdb")
+
+
+class OMDbError(Exception):
+    pass
+
+
+@timed("omdb.request")
+def request_movie_data(movie_title):
+    params = {"i": "tt3896198", "t": movie_title, "apikey": OMDB_API_KEY}
+    for attempt in range(OMDB_RETRIES + 1):
+        try:
+            with _request_slots:
+                response = session.get(OMDB_URL, params=params, timeout=OMDB_TIMEOUT)
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response.json()
+            error = OMDbError(f"OMDb returned HTTP {response.status_code} for {movie_title!r}")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        if attempt < OMDB_RETRIES:
+            time.sleep(OMDB_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+    raise error
+
+
+def parse_movie_details(movie_data):
+    return {
+        "poster_url": movie_data.get('Poster'),
+        "title": movie_data.get('Title', 'N/A'),
+        "year": movie_data.get('Year', 'N/A'),
+        "genre": movie_data.get('Genre', 'N/A'),
+        "imdb_rating": movie_data.get('imdbRating', 'N/A'),
+        "plot": movie_data.get('Plot', 'N/A'),
+        "imdb_id": movie_data.get('imdbID', 'N/A'),
+    }
+
+
+# Same fields as a successful lookup, for titles OMDb could not be asked about
+def placeholder_details(movie_title):
+    details = parse_movie_details({})
+    details["title"] = movie_title
+    return details
+
+
+@timed("fetch_movie_details")
+def fetch_movie_details(movie_title):
+    cached = metadata_cache.get(movie_title)
+    if cached is not None:
+        return cached
+
+    movie_data = request_movie_data(movie_title)
+    details = parse_movie_details(movie_data)
+    metadata_cache.set(movie_title, details, found=movie_data.get('Response') != 'False')
+    return details
+
+
+# Look up many titles concurrently. The result is aligned with movie_titles;
+# lookups that still fail after retrying are None.
+def fetch_movie_details_batch(movie_titles):
+    futures = [_executor.submit(fetch_movie_details, title) for title in movie_titles]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except (requests.RequestException, OMDbError, ValueError):
+            results.append(None)
+    return results
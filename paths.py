@@ -0,0 +1,7 @@
+import os
+
+# Locations of the files shipped with the app, importable without loading
+# the catalog or anything else resources.py pulls in
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+CSS_DIR = os.path.join(PACKAGE_DIR, "css")
+STATIC_DIR = os.path.join(PACKAGE_DIR, "static")
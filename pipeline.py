@@ -0,0 +1,416 @@
+import argparse
+import ast
+import json
+import os
+import pickle
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from build_index import ARTIFACT_DIR, DEFAULT_K, load_neighbor_index, save_neighbor_index, top_k_rows
+from catalog import (
+    MOVIES_PICKLE, load_metadata, load_movies, load_vectors, new_version_dir, publish_version,
+    resolve_artifact_dir, save_catalog_columns, save_metadata, save_vectors,
+)
+
+MAX_FEATURES = 5000
+STOP_WORDS = "english"
+CHUNK_ROWS = 2000
+# Dense block of similarities each worker may hold while ranking neighbors
+BLOCK_MB = 256
+
+
+# Scripted version of Movie_Recommend.ipynb. Stages run over chunks so memory
+# stays bounded by the chunk size rather than the catalog size:
+#   1. extract top-3 cast and directors from the credits CSV
+#   2. merge with the movies CSV on title and build the feature text
+#   3. count terms and pick the vocabulary exactly like CountVectorizer
+#   4. vectorize into L2-normalized sparse rows
+#   5. rank the top-K neighbors block by block
+# Each stage spreads its chunks over a process pool.
+
+
+def _parse_list(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+
+def _names(text, limit=None, job=None):
+    names = [item["name"] for item in _parse_list(text) if job is None or item.get("job") == job]
+    return [name.replace(" ", "") for name in names[:limit]]
+
+
+def _credit_tokens(rows):
+    return [
+        (movie_id, title,
+         None if pd.isna(cast) or pd.isna(crew) else (_names(cast, limit=3), _names(crew, job="Director")))
+        for movie_id, title, cast, crew in rows
+    ]
+
+
+def _movie_features(rows):
+    features = []
+    for genres, keywords, overview, cast, crew in rows:
+        tokens = _names(genres) + _names(keywords) + cast + crew + overview.split()
+        features.append(" ".join(tokens))
+    return features
+
+
+def _analyzer():
+    return CountVectorizer(stop_words=STOP_WORDS).build_analyzer()
+
+
+def _count_terms(features):
+    analyze = _analyzer()
+    counts = Counter()
+    for text in features:
+        counts.update(analyze(text))
+    return counts
+
+
+def _vectorize(args):
+    features, vocabulary = args
+    vectorizer = CountVectorizer(stop_words=STOP_WORDS, vocabulary=vocabulary, dtype=np.float32)
+    return vectorizer.transform(features)
+
+
+def _rank_block(args):
+    vectors_dir, start, stop, k = args
+    vectors = load_vectors(vectors_dir)
+    scores = (vectors[start:stop] @ vectors.T).toarray()
+    return start, top_k_rows(scores, k)
+
+
+def _rank_rows(args):
+    vectors_dir, rows, k = args
+    vectors = load_vectors(vectors_dir)
+    scores = (vectors[rows] @ vectors.T).toarray()
+    return rows, top_k_rows(scores, k)
+
+
+# executor.map submits everything up front; keep only a few chunks in flight
+def _bounded_map(executor, fn, items, jobs):
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= jobs * 2:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def extract_credits(credits_csv, executor, jobs):
+    credits = {}
+    reader = pd.read_csv(credits_csv, usecols=["movie_id", "title", "cast", "crew"], chunksize=CHUNK_ROWS)
+    rows = (list(chunk[["movie_id", "title", "cast", "crew"]].itertuples(index=False, name=None)) for chunk in reader)
+    for parsed in _bounded_map(executor, _credit_tokens, rows, jobs):
+        for movie_id, title, tokens in parsed:
+            credits.setdefault(title, []).append((movie_id, tokens))
+    return credits
+
+
+# Inner merge on title, keeping the notebook's row order and index labels,
+# then drop rows with missing values as movies.dropna() did. Like the
+# notebook, movie_id comes from the credits side of the merge.
+def merge_movies(movies_csv, credits):
+    label = 0
+    reader = pd.read_csv(movies_csv, usecols=["title", "genres", "keywords", "overview"], chunksize=CHUNK_ROWS)
+    for chunk in reader:
+        merged = []
+        for title, genres, keywords, overview in chunk[
+                ["title", "genres", "keywords", "overview"]].itertuples(index=False, name=None):
+            for movie_id, tokens in credits.get(title, ()):
+                if tokens is not None and not any(pd.isna(v) for v in (genres, keywords, overview)):
+                    merged.append((label, int(movie_id), title, (genres, keywords, overview) + tokens))
+                label += 1
+        yield merged
+
+
+def build_features(movies_csv, credits, executor, jobs, features_path):
+    labels, movie_ids, titles = [], [], []
+    merged_chunks = deque()
+
+    def rows():
+        for merged in merge_movies(movies_csv, credits):
+            merged_chunks.append(merged)
+            yield [row for _, _, _, row in merged]
+
+    with open(features_path, "w") as out:
+        for features in _bounded_map(executor, _movie_features, rows(), jobs):
+            merged = merged_chunks.popleft()
+            for (label, movie_id, title, _), text in zip(merged, features):
+                labels.append(label)
+                movie_ids.append(movie_id)
+                titles.append(title)
+                out.write(text + "\n")
+    return labels, movie_ids, titles
+
+
+def read_features(features_path, size=CHUNK_ROWS):
+    chunk = []
+    with open(features_path) as f:
+        for line in f:
+            chunk.append(line.rstrip("\n"))
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+# Same choice as CountVectorizer(max_features=...): terms are sorted, the
+# most frequent are kept (same argsort call, so the same tie-breaking) and
+# the survivors are numbered in sorted order
+def select_vocabulary(term_counts, max_features=MAX_FEATURES):
+    terms = sorted(term_counts)
+    if max_features is not None and len(terms) > max_features:
+        tfs = np.array([term_counts[term] for term in terms], dtype=np.int64)
+        keep = np.sort((-tfs).argsort()[:max_features])
+        terms = [terms[i] for i in keep]
+    return {term: index for index, term in enumerate(terms)}
+
+
+def normalize_rows(vectors):
+    vectors = vectors.tocsr().astype(np.float32)
+    norms = np.sqrt(vectors.multiply(vectors).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(vectors).tocsr().astype(np.float32)
+
+
+def rank_neighbors(vectors_dir, n, k, executor, jobs, block_mb=BLOCK_MB):
+    width = min(k + 1, n)
+    block = max(1, min(block_mb * 2 ** 20 // (n * 4 * 3), -(-n // jobs)))
+    neighbor_ids = np.empty((n, width), dtype=np.int32)
+    neighbor_scores = np.empty((n, width), dtype=np.float32)
+    blocks = ((vectors_dir, start, min(start + block, n), width) for start in range(0, n, block))
+    for start, (ids, scores) in _bounded_map(executor, _rank_block, blocks, jobs):
+        neighbor_ids[start:start + len(ids)] = ids
+        neighbor_scores[start:start + len(ids)] = scores
+    return neighbor_ids, neighbor_scores
+
+
+def _rows_per_block(columns, block_mb=BLOCK_MB):
+    return max(1, block_mb * 2 ** 20 // (max(columns, 1) * 4 * 3))
+
+
+def build(movies_csv, credits_csv, artifact_dir=ARTIFACT_DIR, k=DEFAULT_K, jobs=None,
+          max_features=MAX_FEATURES, movies_pickle=MOVIES_PICKLE, log=print):
+    jobs = jobs or os.cpu_count() or 1
+    os.makedirs(artifact_dir, exist_ok=True)
+    features_path = os.path.join(artifact_dir, "features.txt")
+    vectors_dir = os.path.join(artifact_dir, "vectors")
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        credits = extract_credits(credits_csv, executor, jobs)
+        labels, movie_ids, titles = build_features(movies_csv, credits, executor, jobs, features_path)
+        del credits
+        log(f"Parsed {len(titles)} movies")
+
+        term_counts = Counter()
+        for counts in _bounded_map(executor, _count_terms, read_features(features_path), jobs):
+            term_counts.update(counts)
+        vocabulary = select_vocabulary(term_counts, max_features)
+        del term_counts
+        log(f"Vocabulary of {len(vocabulary)} terms")
+
+        chunks = ((features, vocabulary) for features in read_features(features_path))
+        vectors = sparse.vstack(list(_bounded_map(executor, _vectorize, chunks, jobs)), format="csr")
+        save_vectors(normalize_rows(vectors), vectors_dir)
+        del vectors
+        log(f"Saved sparse vectors to {vectors_dir}")
+
+        neighbor_ids, neighbor_scores = rank_neighbors(vectors_dir, len(titles), k, executor, jobs)
+        save_neighbor_index(neighbor_ids, neighbor_scores, artifact_dir)
+        log(f"Saved top-{k} neighbors to {artifact_dir}")
+
+    with open(os.path.join(artifact_dir, "vocabulary.json"), "w") as f:
+        json.dump(vocabulary, f)
+    save_catalog_columns(artifact_dir, movie_ids, titles)
+
+    # The same dict the notebook pickled with movies_df.to_dict()
+    if movies_pickle:
+        features = [line for chunk in read_features(features_path) for line in chunk]
+        movies = {
+            "movie_id": dict(zip(labels, movie_ids)),
+            "title": dict(zip(labels, titles)),
+            "features": dict(zip(labels, features)),
+        }
+        with open(movies_pickle, "wb") as f:
+            pickle.dump(movies, f)
+        log(f"Wrote {movies_pickle}")
+    os.remove(features_path)
+    return len(titles)
+
+
+# Add or replace movies in the served version without a full rebuild: only
+# the given rows are vectorized, against the frozen vocabulary, and only the
+# neighbor lists they can affect are patched. The result is published as a
+# new version; servers pick it up on their next catalog check.
+def update(movies_csv, credits_csv, artifact_dir=ARTIFACT_DIR, jobs=None, log=print):
+    jobs = jobs or os.cpu_count() or 1
+    base_dir = resolve_artifact_dir(artifact_dir)
+    base = load_movies(base_dir)
+    movie_ids = base["movie_id"].astype(int).tolist()
+    titles = base["title"].tolist()
+    with open(os.path.join(base_dir, "vocabulary.json")) as f:
+        vocabulary = json.load(f)
+    vectors = load_vectors(os.path.join(base_dir, "vectors"))
+    neighbor_ids, neighbor_scores = load_neighbor_index(base_dir, mmap_mode=None)
+    metadata = load_metadata(base_dir)
+    width = neighbor_ids.shape[1]
+
+    version, staging = new_version_dir(artifact_dir)
+    features_path = os.path.join(staging, "features.txt")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        credits = extract_credits(credits_csv, executor, jobs)
+        _, new_ids, new_titles = build_features(movies_csv, credits, executor, jobs, features_path)
+        chunks = ((features, vocabulary) for features in read_features(features_path))
+        new_vectors = normalize_rows(sparse.vstack(list(_bounded_map(executor, _vectorize, chunks, jobs)), format="csr"))
+    os.remove(features_path)
+
+    # A movie id already in the catalog keeps its row; the rest are appended
+    n_old = len(movie_ids)
+    row_of = {}
+    for row, movie_id in enumerate(movie_ids):
+        row_of.setdefault(movie_id, row)
+    source = np.arange(n_old)
+    touched = []
+    for j, (movie_id, title) in enumerate(zip(new_ids, new_titles)):
+        row = row_of.get(movie_id)
+        if row is None:
+            row = len(movie_ids)
+            row_of[movie_id] = row
+            movie_ids.append(movie_id)
+            titles.append(title)
+            source = np.append(source, n_old + j)
+        else:
+            titles[row] = title
+            source[row] = n_old + j
+        touched.append(row)
+    touched = np.unique(touched)
+    vectors = sparse.vstack([vectors, new_vectors], format="csr")[source]
+    n = vectors.shape[0]
+    log(f"{len(touched)} movies to update, {n - n_old} of them new")
+
+    old = np.setdiff1d(np.arange(n_old), touched)
+    touched_vectors = vectors[touched].T.tocsc()
+    position = np.full(n, -1)
+    position[touched] = np.arange(len(touched))
+    recompute = [touched]
+    step = _rows_per_block(len(touched))
+    for start in range(0, len(old), step):
+        rows = old[start:start + step]
+        scores = (vectors[rows] @ touched_vectors).toarray()
+        ids, current = neighbor_ids[rows].astype(np.int64), neighbor_scores[rows].copy()
+        listed = position[ids] >= 0
+        fresh = np.where(listed, np.take_along_axis(scores, np.maximum(position[ids], 0), axis=1), 0)
+        # A listed movie whose score dropped may now be outranked by one
+        # outside the list, so those rows are ranked again from scratch
+        dropped = (listed & (fresh < current)).any(axis=1)
+        recompute.append(rows[dropped])
+
+        current[listed] = -np.inf
+        merged_ids = np.concatenate([ids, np.broadcast_to(touched, (len(rows), len(touched)))], axis=1)
+        merged_scores = np.concatenate([current, scores], axis=1)
+        order = np.lexsort((merged_ids, -merged_scores))[:, :width]
+        neighbor_ids[rows] = np.take_along_axis(merged_ids, order, axis=1)
+        neighbor_scores[rows] = np.take_along_axis(merged_scores, order, axis=1)
+
+    neighbor_ids = np.concatenate([neighbor_ids, np.zeros((n - n_old, width), dtype=np.int32)])
+    neighbor_scores = np.concatenate([neighbor_scores, np.zeros((n - n_old, width), dtype=np.float32)])
+    vectors_dir = os.path.join(staging, "vectors")
+    save_vectors(vectors, vectors_dir)
+    recompute = np.unique(np.concatenate(recompute))
+    step = _rows_per_block(n)
+    blocks = ((vectors_dir, recompute[start:start + step], width) for start in range(0, len(recompute), step))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for rows, (ids, scores) in _bounded_map(executor, _rank_rows, blocks, jobs):
+            neighbor_ids[rows] = ids
+            neighbor_scores[rows] = scores
+    log(f"Re-ranked {len(recompute)} movies, patched {len(old)} neighbor lists")
+
+    save_neighbor_index(neighbor_ids, neighbor_scores, staging)
+    save_catalog_columns(staging, movie_ids, titles)
+    with open(os.path.join(staging, "vocabulary.json"), "w") as f:
+        json.dump(vocabulary, f)
+
+    # Baked OMDb details carry over, except for the movies that changed
+    if metadata is not None:
+        details = [metadata.details(row) for row in range(n_old)] + [None] * (n - n_old)
+        found = np.concatenate([np.asarray(metadata.found, dtype=bool), np.zeros(n - n_old, dtype=bool)])
+        fetched_at = np.concatenate([np.asarray(metadata.fetched_at), np.zeros(n - n_old)])
+        for row in touched:
+            details[row], found[row], fetched_at[row] = None, False, 0.0
+        save_metadata(staging, details, found, fetched_at)
+
+    publish_version(artifact_dir, version, staging)
+    log(f"Published version {version}")
+    return version
+
+
+# Legacy similarity matrices rank near-ties in whatever order float64 dense
+# arithmetic produced, so compare the similarity of the picked neighbors
+# rather than their ids
+def verify_against_similarity(similarity, neighbor_ids, top_n=5, atol=1e-6):
+    rows = np.arange(similarity.shape[0])[:, None]
+    expected = -np.sort(-similarity, axis=1)[:, 1:top_n + 1]
+    actual = similarity[rows, neighbor_ids[:, 1:top_n + 1]]
+    return np.flatnonzero((np.abs(expected - actual) > atol).any(axis=1)).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the catalog, vectors and neighbor index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="full rebuild from the TMDB CSVs")
+    build_parser.add_argument("--movies", default="tmdb_5000_movies.csv")
+    build_parser.add_argument("--credits", default="tmdb_5000_credits.csv")
+    build_parser.add_argument("--out", default=ARTIFACT_DIR)
+    build_parser.add_argument("-k", type=int, default=DEFAULT_K, help="neighbors kept per movie")
+    build_parser.add_argument("--jobs", type=int, help="worker processes (default: all cores)")
+    build_parser.add_argument("--max-features", type=int, default=MAX_FEATURES)
+    build_parser.add_argument("--movies-pickle", default=MOVIES_PICKLE,
+                              help="also write the legacy movies_dict.pkl here ('' to skip)")
+    build_parser.add_argument("--publish", action="store_true",
+                              help="write a new version under --out and make it the served one")
+    build_parser.add_argument("--verify-against", metavar="SIMILARITY_PKL",
+                              help="check top-5 results against a similarity.pkl from the notebook")
+
+    update_parser = commands.add_parser("update", help="add or replace the movies in the given CSVs")
+    update_parser.add_argument("--movies", required=True)
+    update_parser.add_argument("--credits", required=True)
+    update_parser.add_argument("--out", default=ARTIFACT_DIR)
+    update_parser.add_argument("--jobs", type=int, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        update(args.movies, args.credits, args.out, args.jobs)
+        return
+
+    out_dir = args.out
+    if args.publish:
+        version, out_dir = new_version_dir(args.out)
+    build(args.movies, args.credits, out_dir, args.k, args.jobs, args.max_features, args.movies_pickle)
+    if args.publish:
+        publish_version(args.out, version, out_dir)
+        out_dir = resolve_artifact_dir(args.out)
+        print(f"Published version {version}")
+
+    if args.verify_against:
+        with open(args.verify_against, "rb") as f:
+            similarity = pickle.load(f)
+        mismatches = verify_against_similarity(similarity, load_neighbor_index(out_dir)[0])
+        if mismatches:
+            print(f"Top-5 mismatch for {len(mismatches)} rows, first: {mismatches[:10]}")
+            raise SystemExit(1)
+        print("Top-5 results match the notebook's similarity matrix")
+
+
+if __name__ == "__main__":
+    main()
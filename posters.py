@@ -0,0 +1,230 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
+
+from metrics import register_gauges
+from paths import STATIC_DIR
+
+POSTER_CACHE_DIR = os.getenv("POSTER_CACHE_DIR", os.path.join(".cache", "posters"))
+POSTER_CACHE_MAX_BYTES = int(os.getenv("POSTER_CACHE_MAX_MB", 200)) * 2 ** 20
+POSTER_TIMEOUT = float(os.getenv("POSTER_TIMEOUT", 5))
+POSTER_CONCURRENCY = int(os.getenv("POSTER_CONCURRENCY", 8))
+# Widths the UI shows posters at: recommendation cards and the watchlist
+THUMBNAIL_WIDTHS = (180, 100)
+# A poster that failed to download is not retried for this many seconds;
+# at most FAILURE_MAX such URLs are remembered
+FAILURE_TTL = 600
+FAILURE_MAX = 10000
+# Temporary files younger than this may still be being written; older ones
+# were left behind by a crash and go on the next eviction
+TMP_GRACE_SECONDS = 300
+FALLBACK_POSTER = os.path.join(STATIC_DIR, "home_banner.png")
+
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=POSTER_CONCURRENCY))
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POSTER_CONCURRENCY))
+_executor = ThreadPoolExecutor(max_workers=POSTER_CONCURRENCY, thread_name_prefix="posters")
+
+
+# Thumbnails on disk, named by the hash of the original image so a poster
+# reachable under several URLs is stored once:
+#   urls/<sha256 of url>       -> content hash of the downloaded poster
+#   <hh>/<content hash>_<w>.jpg -> thumbnail <w> pixels wide
+# Both are touched when served; past the size limit the least recently
+# served files are deleted, URL entries included.
+class PosterCache:
+    def __init__(self, directory=POSTER_CACHE_DIR, max_bytes=POSTER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._evicting = False
+        self._failures = OrderedDict()
+        # url -> [lock, number of threads holding or waiting for it]
+        self._url_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "downloads": 0, "failures": 0}
+
+    def _url_path(self, url):
+        return os.path.join(self.directory, "urls", hashlib.sha256(url.encode()).hexdigest())
+
+    def _thumbnail_path(self, digest, width):
+        return os.path.join(self.directory, digest[:2], f"{digest}_{width}.jpg")
+
+    def _cached(self, url, width):
+        url_path = self._url_path(url)
+        try:
+            with open(url_path) as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        path = self._thumbnail_path(digest, width)
+        try:
+            os.utime(path)
+            os.utime(url_path)
+        except OSError:
+            return None
+        return path
+
+    # Failures are kept in the order they happened, so expired ones are
+    # always at the front
+    def _failed_recently(self, url):
+        now = time.monotonic()
+        with self._lock:
+            while self._failures and now - next(iter(self._failures.values())) >= FAILURE_TTL:
+                self._failures.popitem(last=False)
+            return url in self._failures
+
+    def _failed(self, url):
+        with self._lock:
+            self._failures.pop(url, None)
+            self._failures[url] = time.monotonic()
+            while len(self._failures) > FAILURE_MAX:
+                self._failures.popitem(last=False)
+            self.stats["failures"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        replaced = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+
+    def _store(self, url, original):
+        digest = hashlib.sha256(original).hexdigest()
+        with Image.open(io.BytesIO(original)) as image:
+            image = image.convert("RGB")
+            for width in THUMBNAIL_WIDTHS:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((width, width * 4))
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, "JPEG", quality=85, optimize=True)
+                self._write(self._thumbnail_path(digest, width), buffer.getvalue())
+        self._write(self._url_path(url), digest.encode())
+        self._evict()
+
+    # Local path of the poster thumbnail, downloading it on first use; the
+    # bundled fallback image when there is no poster or it cannot be fetched
+    def get(self, url, width):
+        if not isinstance(url, str) or not url or url == "N/A" or width not in THUMBNAIL_WIDTHS:
+            return FALLBACK_POSTER
+        path = self._cached(url, width)
+        if path is not None:
+            self._count("hits")
+            return path
+        if self._failed_recently(url):
+            return FALLBACK_POSTER
+
+        # One download per URL however many sessions ask at once; the lock is
+        # dropped once nobody holds or waits for it
+        with self._lock:
+            entry = self._url_locks.setdefault(url, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                path = self._cached(url, width)
+                if path is None and not self._failed_recently(url):
+                    try:
+                        response = session.get(url, timeout=POSTER_TIMEOUT)
+                        response.raise_for_status()
+                        self._store(url, response.content)
+                        path = self._cached(url, width)
+                        self._count("downloads")
+                    except (requests.RequestException, UnidentifiedImageError, OSError):
+                        self._failed(url)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._url_locks[url]
+        return path or FALLBACK_POSTER
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    continue
+
+    # Directory scans run without the lock, so poster requests do not queue
+    # behind them; the lock only guards the size total
+    def _scan_size(self):
+        return sum(stat.st_size for path, stat in self._files() if not path.endswith(".tmp"))
+
+    def _evict(self):
+        if self.size() <= self.max_bytes:
+            return
+        with self._lock:
+            if self._evicting:
+                return
+            self._evicting = True
+        try:
+            # Down to 90% so eviction does not run on every new poster
+            target = self.max_bytes * 0.9
+            now = time.time()
+            files = sorted(self._files(), key=lambda entry: entry[1].st_mtime)
+            with self._lock:
+                size = self._size
+            removed = 0
+            for path, stat in files:
+                if path.endswith(".tmp"):
+                    # Younger ones may still be being written by another thread
+                    if now - stat.st_mtime >= TMP_GRACE_SECONDS:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                    continue
+                if size - removed <= target:
+                    continue
+                try:
+                    os.remove(path)
+                    removed += stat.st_size
+                except OSError:
+                    pass
+            with self._lock:
+                self._size -= removed
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def size(self):
+        with self._lock:
+            size = self._size
+        if size is None:
+            scanned = self._scan_size()
+            with self._lock:
+                if self._size is None:
+                    self._size = scanned
+                size = self._size
+        return size
+
+
+poster_cache = PosterCache()
+register_gauges("poster_cache", lambda: dict(poster_cache.stats, bytes=poster_cache.size()))
+
+
+def poster_image(url, width):
+    return poster_cache.get(url, width)
+
+
+# Thumbnails for a whole page of movies, downloaded concurrently
+def poster_images(urls, width):
+    return list(_executor.map(lambda url: poster_cache.get(url, width), urls))
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from build_index import top_k_rows
+from db import get_watchlist_movie_ids, on_watchlist_change
+from metrics import register_gauges
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 1024))
+# Watchlist changes only invalidate the profile in the process that made
+# them; other app or API processes rebuild it after this many seconds
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 60))
+
+
+# A user's taste as one query: the normalized sum of the vectors of every
+# watchlisted movie. Catalogs without vectors fall back to the summed
+# neighbor lists of those movies. Scores are zeroed for the movies already
+# watchlisted: seed_rows and any other rows of the same movies
+# (exclude_rows, seed_rows by default).
+class UserProfile:
+    def __init__(self, catalog, seed_rows, exclude_rows=None):
+        self.catalog = catalog
+        self.seed_rows = seed_rows
+        self.exclude_rows = seed_rows if exclude_rows is None else exclude_rows
+        self.built_at = time.monotonic()
+        self.vector = None
+        self.neighbor_scores = None
+        if not len(seed_rows):
+            return
+        if catalog.vectors is not None:
+            vector = sparse.csr_matrix(catalog.vectors[seed_rows].sum(axis=0), dtype=np.float32)
+            norm = np.sqrt(vector.multiply(vector).sum())
+            self.vector = vector / norm if norm else vector
+        else:
+            self.neighbor_scores = np.zeros(len(catalog.movies), dtype=np.float32)
+            np.add.at(self.neighbor_scores, catalog.neighbor_ids[seed_rows].ravel(),
+                      catalog.neighbor_scores[seed_rows].ravel())
+
+    # Every catalog movie scored against the profile in one pass
+    def scores(self):
+        if self.vector is not None:
+            scores = np.asarray((self.catalog.vectors @ self.vector.T).todense()).ravel()
+        elif self.neighbor_scores is not None:
+            scores = self.neighbor_scores.copy()
+        else:
+            return np.zeros(len(self.catalog.movies), dtype=np.float32)
+        scores[self.exclude_rows] = 0
+        return scores
+
+
+# Profiles are rebuilt when the user's watchlist changes, a new catalog
+# version is served or they are older than the TTL; the least recently used
+# ones are dropped past the limit
+class ProfileCache:
+    def __init__(self, size=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._profiles = OrderedDict()
+        # Bumped on every invalidation so a profile built from a watchlist
+        # read before the change is not cached
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, username, catalog):
+        with self._lock:
+            profile = self._profiles.get(username)
+            if (profile is not None and profile.catalog is catalog
+                    and time.monotonic() - profile.built_at < self.ttl):
+                self._profiles.move_to_end(username)
+                self.stats["hits"] += 1
+                return profile
+            self.stats["misses"] += 1
+            generation = self._generations.get(username, 0)
+
+        # A few movie ids appear on several catalog rows; the first one
+        # seeds the profile and none of them is recommended
+        movie_ids = get_watchlist_movie_ids(username)
+        rows = catalog.find_movie_rows(movie_ids)
+        watched = np.flatnonzero(np.isin(catalog.movies["movie_id"], np.asarray(movie_ids, dtype=np.int64)))
+        profile = UserProfile(catalog, np.unique(rows[rows >= 0]), watched)
+        with self._lock:
+            if self._generations.get(username, 0) != generation:
+                return profile
+            self._profiles[username] = profile
+            self._profiles.move_to_end(username)
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def invalidate(self, username):
+        with self._lock:
+            self._profiles.pop(username, None)
+            self.stats["invalidations"] += 1
+            self._generations[username] = self._generations.get(username, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_cache = ProfileCache()
+on_watchlist_change(profile_cache.invalidate)
+register_gauges("profile_cache", lambda: dict(profile_cache.stats, size=len(profile_cache._profiles)))
+
+
+# Top-k movies for a user that are not already on their watchlist. Returns
+# (rows, scores); empty when the watchlist has nothing from this catalog.
+def rank_for_user(username, catalog, k=5):
+    scores = profile_cache.get(username, catalog).scores()
+    rows, top = top_k_rows(scores[None, :], min(k, len(scores)))
+    relevant = top[0] > 0
+    return rows[0][relevant], top[0][relevant]
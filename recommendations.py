@@ -1,52 +1,159 @@
-import pandas as pd
-import pickle
-import requests
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-OMDB_API_KEY = os.getenv("OMDB_API_KEY")
-
-# Load movie data
-movies = pickle.load(open('movies_dict.pkl', 'rb'))
-movies = pd.DataFrame(movies)
-similarity = pickle.load(open('similarity.pkl', 'rb'))
-
-
-# Movie Recommendation System Functions
-def fetch_movie_details(movie_title):
-    response = requests.get(f"http://www.omdbapi.com/?i=tt3896198&t={movie_title}&apikey={OMDB_API_KEY}")
-    movie_data = response.json()
-    poster_url = movie_data.get('Poster')
-    title = movie_data.get('Title', 'N/A')
-    year = movie_data.get('Year', 'N/A')
-    genre = movie_data.get('Genre', 'N/A')
-    imdb_rating = movie_data.get('imdbRating', 'N/A')
-    plot = movie_data.get('Plot', 'N/A')
-    imdb_id = movie_data.get('imdbID', 'N/A')
-
-    return {
-        "poster_url": poster_url,
-        "title": title,
-        "year": year,
-        "genre": genre,
-        "imdb_rating": imdb_rating,
-        "plot": plot,
-        "imdb_id": imdb_id
-    }
-
-
-def recommend(movie):
-    index = movies[movies['title'] == movie].index[0]
-    distances = similarity[index]
-    movies_list = sorted(list(enumerate(distances)), reverse=True, key=lambda x: x[1])[1:6]
-
-    recommendations = []
-
-    for i in movies_list:
-        movie_title = movies.iloc[i[0]].title
-        details = fetch_movie_details(movie_title)
-        recommendations.append(details)
-
-    return recommendations
\ No newline at end of file
+import threading
+import time
+import numpy as np
+from build_index import ARTIFACT_DIR
+from catalog import current_version, load_catalog
+from metrics import timed
+from neighbors import get_engine
+from profiles import rank_for_user
+from result_cache import RESULT_CACHE_WARM, request_log, result_cache
+from search_index import DEFAULT_LIMIT, get_search_index
+from omdb import fetch_movie_details_batch, placeholder_details
+
+# How often to look for a newly published artifact version, in seconds
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", 10))
+
+_catalog = None
+_catalog_checked = 0.0
+_catalog_lock = threading.Lock()
+
+
+# Load movie data: memory-mapped artifacts when exported, pickles otherwise.
+# When pipeline.py publishes a new version the next call swaps it in; callers
+# should take the catalog once per request and use it throughout.
+def current_catalog():
+    global _catalog, _catalog_checked
+    if _catalog is not None and time.monotonic() - _catalog_checked < CATALOG_RELOAD_INTERVAL:
+        return _catalog
+    with _catalog_lock:
+        if _catalog is None or time.monotonic() - _catalog_checked >= CATALOG_RELOAD_INTERVAL:
+            if _catalog is None or current_version(ARTIFACT_DIR) != _catalog.version:
+                started = time.perf_counter()
+                _catalog = load_catalog(ARTIFACT_DIR)
+                _catalog.load_seconds["catalog"] = time.perf_counter() - started
+            _catalog_checked = time.monotonic()
+    return _catalog
+
+
+# Rank the neighbors of many titles at once. Returns (rows, scores) arrays of
+# shape (len(titles), k); unknown titles and positions past the stored depth
+# are padded with -1 / nan.
+@timed("rank_batch")
+def rank_batch(titles, k=5, offset=0, catalog=None):
+    catalog = catalog or current_catalog()
+    query_rows = catalog.find_rows(titles)
+    start = 1 + offset
+    rows = np.full((len(query_rows), k), -1, dtype=np.int64)
+    scores = np.full((len(query_rows), k), np.nan, dtype=np.float32)
+    known = query_rows >= 0
+    if known.any():
+        ids, found = get_engine(catalog).search_rows(query_rows[known], start + k)
+        ids, found = ids[:, start:], found[:, start:]
+        rows[known, :ids.shape[1]] = ids
+        scores[known, :ids.shape[1]] = found
+    return rows, scores
+
+
+def rank(movie, k=5, offset=0, catalog=None):
+    rows, scores = rank_batch([movie], k, offset, catalog)
+    found = rows[0] >= 0
+    return rows[0][found], scores[0][found]
+
+
+@timed("recommend")
+def recommend(movie, k=5, offset=0):
+    return recommend_batch([movie], k, offset)[0]
+
+
+# Details baked into the catalog by enrich_catalog.py are used as-is; only
+# rows that were never enriched go to OMDb, all in one concurrent batch.
+# Also returns the positions that got placeholders because OMDb failed.
+def _with_details(movie_rows, catalog):
+    movies = catalog.movies
+    details = [catalog.movie_details(row) for row in movie_rows]
+    missing = [i for i, d in enumerate(details) if d is None]
+    failed = set()
+    if missing:
+        missing_titles = [movies['title'][movie_rows[i]] for i in missing]
+        fetched = fetch_movie_details_batch(missing_titles)
+        for i, title, d in zip(missing, missing_titles, fetched):
+            if d is None:
+                d = placeholder_details(title)
+                failed.add(i)
+            details[i] = d
+    # The catalog (TMDB) id is what the watchlist stores
+    for row, d in zip(movie_rows, details):
+        d["movie_id"] = int(movies['movie_id'][row])
+    return details, failed
+
+
+# Finished lists come from the result cache; the rest are ranked and looked
+# up together and cached unless an OMDb lookup failed. Only callers holding
+# the catalog being served move the cache to its version; one that took an
+# older catalog just before a swap misses and caches nothing.
+def _recommend_batch(titles, k, offset, catalog, popular=False):
+    if current_catalog().version == catalog.version and result_cache.use_version(catalog.version):
+        start_warming(catalog)
+    results = [result_cache.get((title, k, offset), catalog.version) for title in titles]
+    todo = [i for i, result in enumerate(results) if result is None]
+    if not todo:
+        return results
+    rows, _ = rank_batch([titles[i] for i in todo], k, offset, catalog)
+    movie_rows = [[int(i) for i in row if i >= 0] for row in rows]
+    details, failed = _with_details([i for group in movie_rows for i in group], catalog)
+    start = 0
+    for i, group in zip(todo, movie_rows):
+        results[i] = details[start:start + len(group)]
+        if not failed.intersection(range(start, start + len(group))):
+            result_cache.put((titles[i], k, offset), catalog.version, results[i], popular)
+        start += len(group)
+    return results
+
+
+@timed("recommend_batch")
+def recommend_batch(titles, k=5, offset=0):
+    request_log.record(titles, k, offset)
+    return _recommend_batch(titles, k, offset, current_catalog())
+
+
+# Fill the result cache with the lists the request log asks for most, ranked
+# against catalog; stops once another version is being served
+def warm_result_cache(catalog, limit=RESULT_CACHE_WARM):
+    groups = {}
+    for title, k, offset in request_log.popular(limit):
+        groups.setdefault((k, offset), []).append(title)
+    for (k, offset), titles in groups.items():
+        for start in range(0, len(titles), 32):
+            if current_catalog().version != catalog.version:
+                return
+            _recommend_batch(titles[start:start + 32], k, offset, catalog, popular=True)
+
+
+_warmed_versions = set()
+
+
+# Warms the cache in the background, once per catalog version
+def start_warming(catalog):
+    with _catalog_lock:
+        if catalog.version in _warmed_versions:
+            return
+        _warmed_versions.add(catalog.version)
+    threading.Thread(target=warm_result_cache, args=(catalog,), name="result-cache-warm", daemon=True).start()
+
+
+# "For you" recommendations from everything on the user's watchlist
+@timed("recommend_for_user")
+def recommend_for_user(username, k=5):
+    catalog = current_catalog()
+    rows, _ = rank_for_user(username, catalog, k)
+    return _with_details([int(row) for row in rows], catalog)[0]
+
+
+def movie_titles():
+    return current_catalog().movies['title'].tolist()
+
+
+@timed("search_titles")
+def search_titles(query, limit=DEFAULT_LIMIT):
+    return get_search_index(current_catalog()).search(query, limit)
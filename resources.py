@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from neighbors import get_engine
+from paths import CSS_DIR
+from recommendations import current_catalog, start_warming
+from search_index import get_search_index
+
+STYLESHEETS = ("styles.css", "showstyles.css")
+
+# Everything below is loaded once per process and shared read-only by every
+# session: the catalog (swapped whole when a new version is published), its
+# neighbor engine and search index, and the stylesheets.
+_stylesheets = {}
+_load_seconds = {}
+_warm_lock = threading.Lock()
+
+
+def stylesheet(name):
+    css = _stylesheets.get(name)
+    if css is None:
+        with open(os.path.join(CSS_DIR, name), "r") as f:
+            css = _stylesheets[name] = f.read()
+    return css
+
+
+def _timed(timings, name, loader):
+    if name not in timings:
+        started = time.perf_counter()
+        loader()
+        timings[name] = time.perf_counter() - started
+
+
+# Load everything a request can touch so the first user does not wait for it.
+# Safe to call repeatedly: loaded resources are reused. The most requested
+# recommendation lists are then computed in the background. A UI that talks
+# to the API service passes catalog=False and only loads its stylesheets.
+def warm_up(catalog=True):
+    with _warm_lock:
+        for name in STYLESHEETS:
+            _timed(_load_seconds, f"css/{name}", lambda: stylesheet(name))
+        if not catalog:
+            return None
+        catalog = current_catalog()
+        _timed(catalog.load_seconds, "neighbor engine", lambda: get_engine(catalog))
+        _timed(catalog.load_seconds, "search index", lambda: get_search_index(catalog))
+        start_warming(catalog)
+    return resource_report()
+
+
+def is_ready():
+    catalog = current_catalog()
+    return (catalog.engine is not None and catalog.search_index is not None
+            and all(name in _stylesheets for name in STYLESHEETS))
+
+
+def _array_bytes(*arrays):
+    return sum(array.nbytes for array in arrays if array is not None)
+
+
+def _resident_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # Peak rather than current on platforms without /proc; KiB on Linux,
+        # bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Load time and size of each shared resource. Memory-mapped arrays count
+# their full size, even though the OS only keeps the touched pages resident.
+def resource_report():
+    catalog = current_catalog()
+    vectors = catalog.vectors
+    search_index = catalog.search_index
+    rows = [
+        ("catalog", f"{catalog.source} {catalog.version or ''}".strip(),
+         _array_bytes(catalog.neighbor_ids, catalog.neighbor_scores)
+         + catalog.movies.nbytes),
+        ("vectors", f"{vectors.shape[0]}x{vectors.shape[1]}" if vectors is not None else "not loaded",
+         _array_bytes(vectors.data, vectors.indices, vectors.indptr) if vectors is not None else 0),
+        ("neighbor engine", catalog.engine.name if catalog.engine is not None else "not loaded",
+         sum(value.nbytes for value in vars(catalog.engine).values() if isinstance(value, np.ndarray))
+         if catalog.engine is not None else 0),
+        ("search index", f"{len(search_index)} titles" if search_index is not None else "not loaded",
+         sum(postings.nbytes for postings in search_index._postings.values()) if search_index is not None else 0),
+    ]
+    rows += [(f"css/{name}", "loaded" if name in _stylesheets else "not loaded", len(_stylesheets.get(name, "")))
+             for name in STYLESHEETS]
+    return {
+        "resources": [
+            {"name": name, "state": state, "bytes": size,
+             "load_seconds": catalog.load_seconds.get(name, _load_seconds.get(name))}
+            for name, state, size in rows
+        ],
+        "resident_bytes": _resident_bytes(),
+    }
+
+
+def format_report(report):
+    lines = [f"{'resource':<20}{'state':<24}{'size':>12}{'load':>10}"]
+    for entry in report["resources"]:
+        load = f"{entry['load_seconds'] * 1000:.0f} ms" if entry["load_seconds"] is not None else "-"
+        lines.append(f"{entry['name']:<20}{entry['state']:<24}{entry['bytes'] / 2 ** 20:>9.1f} MB{load:>10}")
+    lines.append(f"process resident memory: {report['resident_bytes'] / 2 ** 20:.1f} MB")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the shared resources and report load time and memory")
+    parser.add_argument("--check", action="store_true", help="exit non-zero unless everything loaded")
+    args = parser.parse_args()
+
+    report = warm_up()
+    print(format_report(report))
+    if args.check and not is_ready():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import threading
+from collections import Counter, OrderedDict
+
+from metrics import register_gauges
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))
+# Share of the cache kept for entries requested more than once
+PROTECTED_SHARE = 0.8
+# Every recommend request is appended here; the most requested titles are
+# computed ahead of time on startup and whenever a new catalog is served.
+# Set to an empty string to turn the log off.
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", os.path.join(".cache", "recommend_requests.log"))
+REQUEST_LOG_MAX_BYTES = int(os.getenv("REQUEST_LOG_MAX_MB", 20)) * 2 ** 20
+RESULT_CACHE_WARM = int(os.getenv("RESULT_CACHE_WARM", 200))
+
+_UNSET = object()
+
+
+# Finished recommendation lists keyed by (title, k, offset) for one catalog
+# version. Segmented LRU: new entries start in a probation segment and move
+# to the protected one on their second hit, so a run of one-off titles only
+# evicts other one-off titles and the popular ones stay.
+class ResultCache:
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self.protected_size = int(size * PROTECTED_SHARE)
+        self.version = _UNSET
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    # Drops every entry when a different catalog version is being served;
+    # returns whether that happened after the first version was seen
+    def use_version(self, version):
+        with self._lock:
+            if version == self.version:
+                return False
+            changed = self.version is not _UNSET
+            self.version = version
+            self._probation.clear()
+            self._protected.clear()
+            if changed:
+                self.stats["invalidations"] += 1
+            return changed
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self.version:
+                return None
+            result = self._protected.get(key)
+            if result is not None:
+                self._protected.move_to_end(key)
+            else:
+                result = self._probation.pop(key, None)
+                if result is not None:
+                    self._promote(key, result)
+            self.stats["hits" if result is not None else "misses"] += 1
+            return list(result) if result is not None else None
+
+    def _promote(self, key, result):
+        self._protected[key] = result
+        if len(self._protected) > self.protected_size:
+            demoted, value = self._protected.popitem(last=False)
+            self._probation[demoted] = value
+            self._trim()
+
+    def _trim(self):
+        while len(self._probation) + len(self._protected) > self.size and self._probation:
+            self._probation.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # Results computed from an older catalog are dropped
+    def put(self, key, version, result, popular=False):
+        with self._lock:
+            if version != self.version or key in self._protected:
+                return
+            if popular:
+                self._probation.pop(key, None)
+                self._promote(key, tuple(result))
+            else:
+                self._probation[key] = tuple(result)
+                self._probation.move_to_end(key)
+            self._trim()
+
+    def clear(self):
+        with self._lock:
+            self._probation.clear()
+            self._protected.clear()
+
+    def __len__(self):
+        return len(self._probation) + len(self._protected)
+
+
+# One "k<TAB>offset<TAB>title" line per requested title. Past the size limit
+# the log is moved to <path>.1, replacing the previous one.
+class RequestLog:
+    def __init__(self, path=REQUEST_LOG_PATH, max_bytes=REQUEST_LOG_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, titles, k, offset):
+        if not self.path:
+            return
+        lines = "".join(f"{k}\t{offset}\t{title}\n" for title in titles if "\t" not in title and "\n" not in title)
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(lines)
+                self._file.flush()
+                if self._file.tell() > self.max_bytes:
+                    self._file.close()
+                    self._file = None
+                    os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                pass  # losing popularity data must not fail a request
+
+    # The most requested (title, k, offset) entries, most popular first
+    def popular(self, limit):
+        counts = Counter()
+        for path in (f"{self.path}.1", self.path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        parts = line.rstrip("\n").split("\t", 2)
+                        if len(parts) == 3 and parts[2]:
+                            try:
+                                counts[(parts[2], int(parts[0]), int(parts[1]))] += 1
+                            except ValueError:
+                                continue
+            except OSError:
+                continue
+        return [key for key, _ in counts.most_common(limit)]
+
+
+result_cache = ResultCache()
+request_log = RequestLog()
+register_gauges("result_cache", lambda: dict(result_cache.stats, size=len(result_cache)))
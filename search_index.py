@@ -0,0 +1,157 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+
+DEFAULT_LIMIT = 20
+# Trigram similarity a misspelled query needs to reach
+FUZZY_THRESHOLD = 0.3
+# Substring candidates are checked one by one once this few are left
+VERIFY_CANDIDATES = 64
+
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"\W+", " ", text.casefold()).split())
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Which of the candidate rows appear in a sorted posting list
+def _contains(rows, candidates):
+    positions = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+    return rows[positions] == candidates
+
+
+# Title search built once per catalog: exact, prefix and word-prefix matches
+# come from a sorted key list, substrings from a trigram inverted index, and
+# typos from trigram overlap with the same index. A few catalog titles
+# repeat; only the first row of each is indexed, so each is suggested once.
+class TitleSearchIndex:
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.normalized = [normalize(title) for title in self.titles]
+        first_rows = {}
+        for row, title in enumerate(self.titles):
+            first_rows.setdefault(title, row)
+        indexed = sorted(first_rows.values())
+
+        # Every title is indexed from the start of each of its words
+        keys = []
+        for row in indexed:
+            norm = self.normalized[row]
+            words = norm.split(" ")
+            for start in range(len(words)):
+                keys.append((" ".join(words[start:]), start > 0, row))
+        keys.sort()
+        self._keys = [key for key, _, _ in keys]
+        self._key_is_word = [is_word for _, is_word, _ in keys]
+        self._key_rows = [row for _, _, row in keys]
+
+        postings = {}
+        trigram_counts = np.zeros(len(self.titles), dtype=np.int32)
+        for row in indexed:
+            trigrams = _trigrams(self.normalized[row])
+            trigram_counts[row] = len(trigrams)
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(row)
+        self._postings = {trigram: np.array(rows, dtype=np.int32) for trigram, rows in postings.items()}
+        self._trigram_counts = trigram_counts
+        self._lengths = np.array([len(norm) for norm in self.normalized], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _prefix_matches(self, query, matches, limit):
+        position = bisect_left(self._keys, query)
+        while position < len(self._keys) and self._keys[position].startswith(query) and len(matches) < limit:
+            row = self._key_rows[position]
+            if self._keys[position] == query and not self._key_is_word[position]:
+                tier = EXACT
+            else:
+                tier = WORD_PREFIX if self._key_is_word[position] else PREFIX
+            if tier < matches.get(row, FUZZY + 1):
+                matches[row] = tier
+            position += 1
+
+    def _substring_matches(self, query, matches, limit):
+        lists = [self._postings.get(query[i:i + 3]) for i in range(len(query) - 2)]
+        if any(rows is None for rows in lists):
+            return
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            if len(candidates) <= VERIFY_CANDIDATES:
+                break
+            candidates = candidates[_contains(rows, candidates)]
+        for row in candidates.tolist():
+            if len(matches) >= limit:
+                return
+            if row not in matches and query in self.normalized[row]:
+                matches[row] = SUBSTRING
+
+    # A title sharing s of the query's q trigrams is at most s / q similar,
+    # so titles sharing too few are dropped before scoring
+    def _fuzzy_matches(self, query):
+        query_trigrams = _trigrams(query)
+        trigrams = [self._postings[t] for t in query_trigrams if t in self._postings]
+        if not trigrams:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        query_count = len(query_trigrams)
+        needed = next(s for s in range(1, query_count + 1) if s / query_count >= FUZZY_THRESHOLD)
+        shared = np.bincount(np.concatenate(trigrams), minlength=len(self.titles))
+        candidates = np.flatnonzero(shared >= needed)
+        shared = shared[candidates]
+        similarity = shared / (query_count + self._trigram_counts[candidates] - shared)
+        keep = similarity >= FUZZY_THRESHOLD
+        return candidates[keep], similarity[keep]
+
+    def search_rows(self, query, limit=DEFAULT_LIMIT):
+        query = normalize(query)
+        if not query:
+            return []
+
+        # Collect more than needed so shorter titles can win within a tier
+        budget = limit * 10
+        matches = {}
+        self._prefix_matches(query, matches, budget)
+        if len(query) >= 3 and len(matches) < budget:
+            self._substring_matches(query, matches, budget)
+
+        ranked = sorted(matches, key=lambda row: (matches[row], self._lengths[row], row))[:limit]
+        if len(ranked) < limit and len(query) >= 3:
+            rows, similarity = self._fuzzy_matches(query)
+            order = np.lexsort((rows, -similarity))
+            seen = set(ranked)
+            for row in rows[order].tolist():
+                if len(ranked) >= limit:
+                    break
+                if row not in seen:
+                    ranked.append(row)
+        return ranked
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        return [self.titles[row] for row in self.search_rows(query, limit)]
+
+
+_index_lock = threading.Lock()
+
+
+# One index per catalog, shared by every session; a hot-swapped catalog
+# gets its own
+def get_search_index(catalog):
+    index = getattr(catalog, "search_index", None)
+    if index is None:
+        with _index_lock:
+            index = getattr(catalog, "search_index", None)
+            if index is None:
+                index = catalog.search_index = TitleSearchIndex(catalog.movies["title"].tolist())
+    return index
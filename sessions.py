@@ -0,0 +1,73 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import register_gauges
+
+# Logged-in identities are kept here, server side, once the password has been
+# checked; page reruns look them up by token instead of going to Postgres
+SESSION_TTL = float(os.getenv("SESSION_TTL", 8 * 3600))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", 3600))
+SESSION_MAX = int(os.getenv("SESSION_MAX", 10000))
+
+
+class Session:
+    def __init__(self, user_id, username, role):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL, idle_timeout=SESSION_IDLE_TIMEOUT, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, user_id, username, role):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = Session(user_id, username, role)
+            # Oldest sessions go first when the store is full
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return token
+
+    # The session for a token, or None when it is unknown, expired or revoked
+    def get(self, token):
+        if not token:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if now - session.created_at > self.ttl or now - session.last_seen > self.idle_timeout:
+                del self._sessions[token]
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(token)
+            return session
+
+    def end(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    # After a user is deleted, or their password or role changes
+    def end_user(self, username):
+        with self._lock:
+            for token in [t for t, s in self._sessions.items() if s.username == username]:
+                del self._sessions[token]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+session_store = SessionStore()
+register_gauges("sessions", lambda: {"active": len(session_store)})
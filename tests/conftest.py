@@ -0,0 +1,54 @@
+import os
+import secrets
+import sys
+
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# A throwaway schema in the database configured by DB_HOST/DB_NAME/DB_USER/
+# DB_PASSWORD, first on every connection's search_path; dropped afterwards.
+# Skips when Postgres is unreachable.
+@pytest.fixture
+def postgres_schema(monkeypatch):
+    import psycopg2
+
+    import db
+
+    try:
+        conn = db.connect_to_postgresql()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    schema = f"test_{secrets.token_hex(4)}"
+    with conn, conn.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+    monkeypatch.setenv("PGOPTIONS", f"-c search_path={schema}")
+    db.close_pool()
+    try:
+        yield db
+    finally:
+        db.close_pool()
+        with conn, conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
+
+
+# The same, migrated to the current version
+@pytest.fixture
+def postgres(postgres_schema, monkeypatch):
+    import migrate
+
+    monkeypatch.setattr(migrate, "_applied", False)
+    migrate.apply_migrations()
+    return postgres_schema
+
+
+# auth against the throwaway schema, with a KDF cheap enough for tests
+@pytest.fixture
+def auth(postgres, monkeypatch):
+    import auth
+
+    monkeypatch.setattr(auth, "AUTH_KDF_ITERATIONS", 1)
+    return auth
@@ -0,0 +1,71 @@
+import time
+
+import psycopg2
+import pytest
+
+
+def _terminate(db, pid):
+    conn = db.connect_to_postgresql()
+    with conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_terminate_backend(%s)", (pid,))
+    conn.close()
+
+
+def _stat(db, name):
+    return db.get_pool_stats()[name]
+
+
+def test_checkout_returns_connection_to_pool(postgres):
+    db = postgres
+    checkouts = _stat(db, "checkouts")
+    with db.get_connection() as conn:
+        pid = conn.get_backend_pid()
+        assert _stat(db, "in_use") == 1
+    assert _stat(db, "in_use") == 0
+    assert conn.last_used > 0
+    # The pool hands out the most recently returned connection first
+    with db.get_connection() as again:
+        assert again.get_backend_pid() == pid
+    assert _stat(db, "checkouts") == checkouts + 2
+
+
+def test_error_rolls_back(postgres):
+    db = postgres
+    with pytest.raises(ZeroDivisionError):
+        with db.get_cursor() as cursor:
+            cursor.execute("CREATE TABLE pool_probe (id INTEGER)")
+            1 / 0
+    with db.get_cursor() as cursor:
+        cursor.execute("SELECT to_regclass('pool_probe')")
+        assert cursor.fetchone() == (None,)
+
+
+def test_idle_connection_is_checked_and_replaced(postgres, monkeypatch):
+    db = postgres
+    with db.get_connection() as conn:
+        pid = conn.get_backend_pid()
+    _terminate(db, pid)
+    monkeypatch.setattr(db, "DB_POOL_CHECK_AFTER", 0)
+    discarded = _stat(db, "discarded")
+    with db.get_cursor() as cursor:
+        cursor.execute("SELECT pg_backend_pid()")
+        assert cursor.fetchone()[0] != pid
+    assert _stat(db, "discarded") == discarded + 1
+
+
+def test_recently_used_connection_skips_health_check(postgres, monkeypatch):
+    db = postgres
+    monkeypatch.setattr(db, "DB_POOL_CHECK_AFTER", 3600)
+    with db.get_connection() as conn:
+        pid = conn.get_backend_pid()
+    _terminate(db, pid)
+    time.sleep(0.1)
+    # Not pinged, so the dead connection is handed out; the failure closes
+    # it instead of returning it to the pool
+    with pytest.raises(psycopg2.OperationalError):
+        with db.get_cursor() as cursor:
+            cursor.execute("SELECT 1")
+    assert conn.closed
+    with db.get_cursor() as cursor:
+        cursor.execute("SELECT pg_backend_pid()")
+        assert cursor.fetchone()[0] != pid
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+import enrich_catalog
+import omdb
+from catalog import current_version, load_metadata, resolve_artifact_dir, save_catalog_columns
+
+
+def _fail(title, limiter):
+    raise omdb.OMDbError("unavailable")
+
+
+# A resumed run that enriches nothing new must still publish what the
+# interrupted run checkpointed before dropping the checkpoint
+def test_checkpointed_rows_are_published_when_nothing_new_is_enriched(tmp_path, monkeypatch):
+    artifact_dir = str(tmp_path)
+    save_catalog_columns(artifact_dir, [10, 20, 30], ["Heat", "Up", "Alien"])
+    details = omdb.placeholder_details("Up")
+    details["year"] = "2009"
+    with open(os.path.join(artifact_dir, enrich_catalog.CHECKPOINT_NAME), "w") as f:
+        f.write(json.dumps({"movie_id": 20, "details": details, "found": True, "fetched_at": 1e12}) + "\n")
+    monkeypatch.setattr(enrich_catalog, "_lookup", _fail)
+
+    done, failed, missing = enrich_catalog.enrich(artifact_dir, rate=0, workers=1)
+    assert (done, failed, missing) == (0, 2, 2)
+    assert current_version(artifact_dir) is not None
+    metadata = load_metadata(resolve_artifact_dir(artifact_dir))
+    assert metadata.details(1)["year"] == "2009"
+    assert not os.path.exists(os.path.join(artifact_dir, enrich_catalog.CHECKPOINT_NAME))
+
+
+def test_failed_publish_keeps_the_checkpoint(tmp_path, monkeypatch):
+    artifact_dir = str(tmp_path)
+    save_catalog_columns(artifact_dir, [10], ["Heat"])
+    checkpoint = os.path.join(artifact_dir, enrich_catalog.CHECKPOINT_NAME)
+    with open(checkpoint, "w") as f:
+        f.write(json.dumps({"movie_id": 10, "details": None, "found": False, "fetched_at": 1e12}) + "\n")
+    monkeypatch.setattr(enrich_catalog, "_lookup", _fail)
+
+    def changed(*args):
+        raise enrich_catalog.VersionChangedError("changed")
+
+    monkeypatch.setattr(enrich_catalog, "_publish", changed)
+    with pytest.raises(enrich_catalog.VersionChangedError):
+        enrich_catalog.enrich(artifact_dir, rate=0, workers=1)
+    assert os.path.exists(checkpoint)
@@ -0,0 +1,36 @@
+import os
+import shutil
+
+import build_index
+import migrate
+from catalog import save_catalog_columns
+
+
+# Legacy watchlist rows reference movies by title; a title the catalog
+# repeats must become one entry for its first row, like the app resolves it
+def test_backfill_resolves_repeated_titles_to_the_first_row(postgres_schema, tmp_path, monkeypatch):
+    db = postgres_schema
+    early = tmp_path / "migrations"
+    early.mkdir()
+    for name in sorted(os.listdir(migrate.MIGRATIONS_DIR)):
+        if name[:4] in ("0001", "0002", "0003"):
+            shutil.copy(os.path.join(migrate.MIGRATIONS_DIR, name), early)
+    migrate.apply_migrations(str(early))
+
+    artifact_dir = str(tmp_path / "artifacts")
+    save_catalog_columns(artifact_dir, [10, 20, 30, 40], ["Heat", "The Host", "Up", "The Host"])
+    monkeypatch.setattr(build_index, "ARTIFACT_DIR", artifact_dir)
+    with db.get_cursor() as cursor:
+        cursor.execute("INSERT INTO users (username, password_hash, role) VALUES ('ann', 'x', 'User')")
+        cursor.execute("INSERT INTO watchlist_legacy (username, movie_name, genre, year) VALUES "
+                       "('ann', 'The Host', 'Horror', 2006), ('ann', 'Up', NULL, NULL), "
+                       "('ann', 'Missing', NULL, NULL)")
+    migrate.apply_migrations()
+
+    with db.get_cursor() as cursor:
+        cursor.execute("SELECT movie_id FROM watchlist ORDER BY movie_id")
+        assert cursor.fetchall() == [(20,), (30,)]
+        cursor.execute("SELECT movie_id, genre FROM movies WHERE title = 'The Host' ORDER BY movie_id")
+        assert cursor.fetchall() == [(20, "Horror"), (40, None)]
+        cursor.execute("SELECT movie_name FROM watchlist_legacy")
+        assert cursor.fetchall() == [("Missing",)]
@@ -0,0 +1,69 @@
+import hashlib
+
+
+def _stored_hash(auth, username):
+    with auth.get_cursor() as cursor:
+        cursor.execute("SELECT password_hash FROM users WHERE username = %s", (username,))
+        return cursor.fetchone()[0]
+
+
+def _add_legacy_user(auth, username, password):
+    with auth.get_cursor() as cursor:
+        cursor.execute("INSERT INTO users (username, password_hash, role) VALUES (%s, %s, 'User') RETURNING id",
+                       (username, hashlib.sha256(password.encode()).hexdigest()))
+        return cursor.fetchone()[0]
+
+
+def test_legacy_hash_is_upgraded_on_login(auth):
+    user_id = _add_legacy_user(auth, "old", "secret")
+    legacy = _stored_hash(auth, "old")
+
+    assert auth.validate_user("old", "wrong", "User") is None
+    assert _stored_hash(auth, "old") == legacy
+
+    assert auth.validate_user("old", "secret", "User") == (user_id,)
+    upgraded = _stored_hash(auth, "old")
+    assert upgraded.startswith(f"{auth.KDF_PREFIX}$1$")
+    assert auth.verify_password("secret", upgraded) == (True, False)
+    assert auth.validate_user("old", "secret", "User") == (user_id,)
+    assert _stored_hash(auth, "old") == upgraded
+
+
+def test_changed_work_factor_rehashes_on_login(auth, monkeypatch):
+    auth.add_users([("user", "secret", "User")])
+    monkeypatch.setattr(auth, "AUTH_KDF_ITERATIONS", 2)
+    assert auth.validate_user("user", "secret", "User") is not None
+    assert _stored_hash(auth, "user").startswith(f"{auth.KDF_PREFIX}$2$")
+
+
+def test_wrong_role_or_missing_user_is_rejected(auth):
+    auth.add_users([("user", "secret", "User")])
+    assert auth.validate_user("user", "secret", "Admin") is None
+    assert auth.validate_user("nobody", "secret", "User") is None
+
+
+def test_hashes_are_salted(monkeypatch):
+    import auth
+
+    monkeypatch.setattr(auth, "AUTH_KDF_ITERATIONS", 1)
+    first, second = auth.hash_password("secret"), auth.hash_password("secret")
+    assert first != second
+    assert auth.verify_password("secret", first)[0]
+    assert not auth.verify_password("Secret", first)[0]
+    assert auth.verify_password("secret", hashlib.sha256(b"secret").hexdigest()) == (True, True)
+
+
+def test_busy_kdf_pool_postpones_the_upgrade(auth):
+    user_id = _add_legacy_user(auth, "old", "secret")
+    legacy = _stored_hash(auth, "old")
+    slots = auth.AUTH_KDF_WORKERS + auth.AUTH_KDF_QUEUE
+    for _ in range(slots):
+        auth._kdf_slots.acquire()
+    try:
+        assert auth.validate_user("old", "secret", "User") == (user_id,)
+    finally:
+        for _ in range(slots):
+            auth._kdf_slots.release()
+    assert _stored_hash(auth, "old") == legacy
+    assert auth.validate_user("old", "secret", "User") == (user_id,)
+    assert _stored_hash(auth, "old").startswith(auth.KDF_PREFIX + "$")
@@ -0,0 +1,52 @@
+import json
+import random
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from build_index import load_neighbor_index, top_k_rows
+from catalog import current_version, load_movies, load_vectors, resolve_artifact_dir
+
+WORDS = ["space", "alien", "heist", "love", "war", "robot", "ghost", "pirate", "detective", "dragon",
+         "island", "prison", "wizard", "zombie", "spy", "royal", "ocean", "desert", "virus", "music"]
+
+
+def _write_csvs(directory, name, movies, rng):
+    movie_rows, credit_rows = [], []
+    for movie_id, title in movies:
+        names = lambda n: json.dumps([{"name": w} for w in rng.sample(WORDS, n)])
+        movie_rows.append({"title": title, "genres": names(2), "keywords": names(2),
+                           "overview": " ".join(rng.sample(WORDS, 4))})
+        credit_rows.append({"movie_id": movie_id, "title": title, "cast": names(3),
+                            "crew": json.dumps([{"name": rng.choice(WORDS), "job": "Director"}])})
+    movies_csv, credits_csv = directory / f"{name}_movies.csv", directory / f"{name}_credits.csv"
+    pd.DataFrame(movie_rows).to_csv(movies_csv, index=False)
+    pd.DataFrame(credit_rows).to_csv(credits_csv, index=False)
+    return str(movies_csv), str(credits_csv)
+
+
+# After replacing some movies and adding others, the patched neighbor lists
+# must hold what ranking the updated vectors from scratch gives
+def test_update_matches_exact_ranking(tmp_path):
+    rng = random.Random(7)
+    artifact_dir = str(tmp_path / "artifacts")
+    base = [(100 + i, f"Movie {i}") for i in range(80)]
+    pipeline.build(*_write_csvs(tmp_path, "base", base, rng), artifact_dir, k=6, jobs=1,
+                   movies_pickle=None, log=lambda message: None)
+    changed = [base[i] for i in (0, 13, 40, 79)] + [(500 + i, f"New movie {i}") for i in range(6)]
+    version = pipeline.update(*_write_csvs(tmp_path, "update", changed, rng), artifact_dir, jobs=1,
+                              log=lambda message: None)
+
+    assert current_version(artifact_dir) == version
+    served = resolve_artifact_dir(artifact_dir)
+    movies = load_movies(served)
+    assert movies["movie_id"].tolist() == [movie_id for movie_id, _ in base] + list(range(500, 506))
+    assert movies["title"][85] == "New movie 5"
+
+    vectors = load_vectors(f"{served}/vectors")
+    neighbor_ids, neighbor_scores = load_neighbor_index(served)
+    similarity = (vectors @ vectors.T).toarray()
+    expected_ids, expected = top_k_rows(similarity, neighbor_ids.shape[1])
+    np.testing.assert_allclose(neighbor_scores, expected, atol=1e-6)
+    assert np.array_equal(neighbor_ids, expected_ids)
@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import posters
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 450), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+# Serves a poster at /ok/<anything> after a short delay and 404 elsewhere,
+# counting requests per path
+@pytest.fixture
+def server():
+    image = _png()
+    requests = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests[self.path] = requests.get(self.path, 0) + 1
+            time.sleep(0.2)
+            if not self.path.startswith("/ok/"):
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}"
+    httpd.requests = requests
+    yield httpd
+    httpd.shutdown()
+
+
+def test_concurrent_requests_download_once(server, tmp_path):
+    cache = posters.PosterCache(str(tmp_path))
+    url = f"{server.url}/ok/poster.png"
+    with ThreadPoolExecutor(8) as executor:
+        paths = list(executor.map(lambda _: cache.get(url, 180), range(16)))
+    assert len(set(paths)) == 1 and paths[0] != posters.FALLBACK_POSTER
+    assert server.requests == {"/ok/poster.png": 1}
+    assert cache._url_locks == {}
+
+
+def test_failures_are_not_retried_and_stay_bounded(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(posters, "FAILURE_MAX", 2)
+    cache = posters.PosterCache(str(tmp_path))
+    with ThreadPoolExecutor(4) as executor:
+        paths = list(executor.map(lambda _: cache.get(f"{server.url}/missing", 180), range(4)))
+    assert paths == [posters.FALLBACK_POSTER] * 4
+    assert server.requests == {"/missing": 1}
+    for name in ("a", "b", "c"):
+        cache.get(f"{server.url}/{name}", 180)
+    assert list(cache._failures) == [f"{server.url}/b", f"{server.url}/c"]
+
+    monkeypatch.setattr(posters, "FAILURE_TTL", 0)
+    assert not cache._failed_recently(f"{server.url}/c")
+    assert len(cache._failures) == 0
+
+
+def test_eviction_removes_url_entries(server, tmp_path):
+    cache = posters.PosterCache(str(tmp_path), max_bytes=1)
+    cache.get(f"{server.url}/ok/one.png", 180)
+    assert os.listdir(tmp_path / "urls") == []
+    assert cache.size() <= 1
+
+
+def test_eviction_leaves_files_being_written(tmp_path):
+    cache = posters.PosterCache(str(tmp_path), max_bytes=10)
+    os.makedirs(tmp_path / "ab")
+    (tmp_path / "ab" / "old.jpg").write_bytes(b"x" * 20)
+    (tmp_path / "ab" / "new.jpg.1.tmp").write_bytes(b"x" * 20)
+    (tmp_path / "ab" / "stale.jpg.2.tmp").write_bytes(b"x" * 20)
+    stale = time.time() - posters.TMP_GRACE_SECONDS - 1
+    os.utime(tmp_path / "ab" / "stale.jpg.2.tmp", (stale, stale))
+    os.utime(tmp_path / "ab" / "old.jpg", (stale, stale))
+    cache._evict()
+    assert sorted(os.listdir(tmp_path / "ab")) == ["new.jpg.1.tmp"]
+    assert cache.size() == 0
@@ -0,0 +1,26 @@
+import numpy as np
+from scipy import sparse
+
+import profiles
+from catalog import Catalog, MovieColumns, TextColumn
+
+
+# Rows 1 and 2 are the same movie, as in the TMDB export; every movie is
+# similar enough to be recommended
+def _catalog():
+    movie_ids = np.array([10, 20, 20, 30, 40], dtype=np.int64)
+    titles = TextColumn.from_values(["Heat", "The Host", "The Host", "Alien", "Up"])
+    vectors = sparse.csr_matrix(np.array([[1, 1, 0], [1, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]],
+                                         dtype=np.float32))
+    return Catalog(MovieColumns(movie_ids, titles), np.zeros((5, 1), dtype=np.int32),
+                   np.zeros((5, 1), dtype=np.float32), "test", vectors=vectors)
+
+
+def test_every_row_of_a_watchlisted_movie_is_excluded(monkeypatch):
+    monkeypatch.setattr(profiles, "get_watchlist_movie_ids", lambda username: [20])
+    monkeypatch.setattr(profiles, "profile_cache", profiles.ProfileCache())
+    catalog = _catalog()
+    profile = profiles.profile_cache.get("user", catalog)
+    assert profile.seed_rows.tolist() == [1]
+    rows, _ = profiles.rank_for_user("user", catalog, k=5)
+    assert sorted(rows.tolist()) == [0, 3, 4]
@@ -0,0 +1,67 @@
+from result_cache import RequestLog, ResultCache
+
+
+def _cache(size=5):
+    cache = ResultCache(size)
+    cache.use_version("v1")
+    return cache
+
+
+def test_second_hit_protects_entry_from_one_off_titles():
+    cache = _cache()
+    cache.put("popular", "v1", ["a"])
+    assert cache.get("popular", "v1") == ["a"]
+    for i in range(20):
+        cache.put(f"once {i}", "v1", [i])
+    assert cache.get("popular", "v1") == ["a"]
+    assert cache.get("once 0", "v1") is None
+    assert len(cache) == 5
+    assert cache.stats["evictions"] == 16
+
+
+def test_probation_evicts_least_recently_added():
+    cache = _cache()
+    for key in "abcdef":
+        cache.put(key, "v1", [key])
+    assert cache.get("a", "v1") is None
+    assert [cache.get(key, "v1") for key in "bcdef"] == [[key] for key in "bcdef"]
+
+
+def test_protected_overflow_demotes_to_probation():
+    cache = _cache()
+    assert cache.protected_size == 4
+    for key in "abcde":
+        cache.put(key, "v1", [key], popular=True)
+    # "a" was the least recently used protected entry, so it went back to
+    # probation and is the first to go when new titles arrive
+    cache.put("x", "v1", ["x"])
+    assert cache.get("a", "v1") is None
+    assert all(cache.get(key, "v1") == [key] for key in "bcde")
+
+
+def test_new_version_drops_entries_and_stale_puts():
+    cache = _cache()
+    cache.put("a", "v1", ["a"])
+    assert cache.use_version("v2") is True
+    assert cache.use_version("v2") is False
+    assert cache.get("a", "v2") is None
+    cache.put("b", "v1", ["b"])
+    assert len(cache) == 0
+    assert cache.get("b", "v1") is None
+    assert cache.stats["invalidations"] == 1
+
+
+def test_results_are_copies():
+    cache = _cache()
+    cache.put("a", "v1", ["x"])
+    cache.get("a", "v1").append("y")
+    assert cache.get("a", "v1") == ["x"]
+
+
+def test_request_log_ranks_popular_titles(tmp_path):
+    log = RequestLog(str(tmp_path / "requests.log"), max_bytes=20)
+    log.record(["Up", "Heat"], 5, 0)
+    log.record(["Heat", "Bad\ttitle"], 5, 0)
+    log.record(["Heat"], 10, 5)
+    assert log.popular(2) == [("Heat", 5, 0), ("Up", 5, 0)]
+    assert (tmp_path / "requests.log.1").exists()
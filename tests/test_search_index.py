@@ -0,0 +1,21 @@
+from search_index import TitleSearchIndex
+
+TITLES = ["Heat", "Heat", "The Heat", "Heathers", "Red Heat", "Heat", "Cheaters", "Avatar", "Amélie"]
+
+
+def test_duplicates_do_not_use_up_the_limit():
+    index = TitleSearchIndex(TITLES)
+    assert index.search("heat", limit=3) == ["Heat", "Heathers", "The Heat"]
+    assert index.search_rows("heat", limit=3)[0] == 0
+
+
+def test_tiers_then_length():
+    index = TitleSearchIndex(TITLES)
+    assert index.search("heat") == ["Heat", "Heathers", "The Heat", "Red Heat", "Cheaters"]
+
+
+def test_accents_and_typos():
+    index = TitleSearchIndex(TITLES)
+    assert index.search("amelie") == ["Amélie"]
+    assert index.search("avatr")[0] == "Avatar"
+    assert index.search("") == []
@@ -0,0 +1,38 @@
+import numpy as np
+
+from build_index import build_neighbor_index, top_k_rows
+
+
+# What the original sorted(enumerate(row), key=score, reverse=True) gave
+def _reference(row, k):
+    return [column for column, _ in sorted(enumerate(row), key=lambda item: item[1], reverse=True)][:k]
+
+
+def test_ties_keep_lowest_columns_in_order():
+    scores = np.array([[0.5, 0.9, 0.5, 0.9, 0.5, 0.1]])
+    ids, top = top_k_rows(scores, 4)
+    assert ids.tolist() == [[1, 3, 0, 2]]
+    assert top.tolist() == [[0.9, 0.9, 0.5, 0.5]]
+
+
+def test_matches_stable_sort_on_heavy_ties():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 4, size=(200, 40)).astype(np.float32)
+    for k in (1, 5, 17, 40):
+        ids, top = top_k_rows(scores, k)
+        assert ids.tolist() == [_reference(row.tolist(), k) for row in scores]
+        assert np.array_equal(top, np.take_along_axis(scores, ids, axis=1))
+
+
+def test_k_larger_than_row():
+    ids, _ = top_k_rows([[0.2, 0.7]], 5)
+    assert ids.tolist() == [[1, 0]]
+
+
+def test_neighbor_index_puts_best_match_first():
+    similarity = np.array([[1.0, 0.3, 0.3],
+                           [0.3, 1.0, 0.6],
+                           [0.3, 0.6, 1.0]], dtype=np.float32)
+    ids, scores = build_neighbor_index(similarity, k=1)
+    assert ids.tolist() == [[0, 1], [1, 2], [2, 1]]
+    assert scores.dtype == np.float32
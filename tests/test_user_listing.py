@@ -0,0 +1,39 @@
+USERNAMES = ["alice", "Alice", "al_x", "alpha", "al%", "bob", "b", "Zed", "zed", "émile", "al\\"]
+
+
+def _walk(auth, limit, prefix="", role=None):
+    pages, after = [], None
+    while True:
+        page = auth.list_users(prefix, role, after=after, limit=limit)
+        if not page:
+            return pages
+        pages.append([username for _, username, _ in page])
+        after = page[-1][1]
+
+
+def test_pages_cover_every_user_once_in_byte_order(auth):
+    auth.add_users([(name, "pw", "User") for name in USERNAMES] + [("root", "pw", "Admin")])
+    pages = _walk(auth, 3)
+    assert [len(page) for page in pages] == [3, 3, 3, 3]
+    assert sum(pages, []) == sorted(USERNAMES + ["root"], key=lambda name: name.encode())
+    assert auth.count_users() == 12
+
+
+def test_prefix_and_role_filters(auth):
+    auth.add_users([(name, "pw", "User") for name in USERNAMES] + [("alien", "pw", "Admin")])
+    # LIKE wildcards in the prefix match themselves only
+    assert sum(_walk(auth, 2, "al_"), []) == ["al_x"]
+    assert sum(_walk(auth, 2, "al%"), []) == ["al%"]
+    assert sum(_walk(auth, 2, "al\\"), []) == ["al\\"]
+    assert sum(_walk(auth, 2, "al", "User"), []) == ["al%", "al\\", "al_x", "alice", "alpha"]
+    assert auth.count_users("al", "Admin") == 1
+
+
+def test_bulk_changes_refresh_counts(auth):
+    assert auth.add_users([("a1", "pw", "User"), ("a2", "pw", "User")]) == 2
+    assert auth.add_users([("a2", "pw", "User")]) == 0
+    assert auth.count_users("a") == 2
+    assert auth.update_users([("a1", None, "Admin"), ("missing", "pw", "User")]) == 1
+    assert auth.count_users("a", "Admin") == 1
+    assert auth.delete_users(["a1", "a2"]) == 2
+    assert auth.count_users("a") == 0
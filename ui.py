@@ -1,19 +1,123 @@
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
-from auth import add_user, validate_user
-from recommendations import recommend, movies
-from db import add_to_watchlist
-
-
-movies_title = movies['title'].values
+from auth import LoginBusyError, add_user, log_in
+from sessions import session_store
+from resources import stylesheet
+from posters import poster_images
+from api_client import RECOMMENDER_API_URL
+
+# Through the recommendation service when one is configured, in process
+# otherwise
+if RECOMMENDER_API_URL:
+    from api_client import add_to_watchlist, movie_titles, recommend, recommend_for_user, search_titles
+else:
+    from db import add_to_watchlist
+    from recommendations import movie_titles, recommend, recommend_for_user, search_titles
+
+
+# Watchlist writes run here instead of on the script thread. A single writer
+# keeps each user's adds and removes in the order they were made.
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="watchlist-writes")
+# How often a view showing unfinished writes checks whether they are done
+WRITE_POLL_SECONDS = 0.5
+
+FLASH_ICONS = {"success": "✅", "info": "ℹ️", "warning": "⚠️", "error": "❌"}
+
+
+# Messages shown as toasts on the next run of the script, so handlers can
+# redirect with st.rerun() straight away
+def flash(message, kind="success", balloons=False):
+    st.session_state.setdefault("flashes", []).append((message, kind, balloons))
+
+
+# Queue a write; describe(result) gives the (message, kind) flashed once it
+# has run. change, ("add", watchlist row) or ("remove", movie_id), is shown
+# in the watchlist until then.
+def queue_write(describe, fn, *args, change=None):
+    future = _write_executor.submit(fn, *args)
+    st.session_state.setdefault("pending_writes", []).append((future, describe, change))
+    return future
+
+
+def _collect_writes():
+    pending = []
+    for future, describe, change in st.session_state.get("pending_writes", []):
+        if not future.done():
+            pending.append((future, describe, change))
+            continue
+        try:
+            flash(*describe(future.result()))
+        except Exception as e:
+            flash(f"Could not update your watchlist: {e}", "error")
+    st.session_state["pending_writes"] = pending
+
+
+# The stored watchlist with the session's unfinished writes applied, so the
+# view renders straight away instead of waiting on the writer
+def with_pending_writes(watchlist):
+    _collect_writes()
+    rows = list(watchlist)
+    for _, _, change in st.session_state["pending_writes"]:
+        if change is None:
+            continue
+        action, value = change
+        if action == "add":
+            if all(row[0] != value[0] for row in rows):
+                rows.append(value)
+        else:
+            rows = [row for row in rows if row[0] != value]
+    return rows
+
+
+# Shown while writes are queued; reruns the page once they are done, so the
+# stored result replaces the optimistic one and their toasts appear
+@st.fragment(run_every=WRITE_POLL_SECONDS)
+def _saving_notice():
+    if all(future.done() for future, _, _ in st.session_state.get("pending_writes", [])):
+        st.rerun()
+    st.caption("Saving your changes…")
+
+
+def reconcile_writes():
+    if st.session_state.get("pending_writes"):
+        _saving_notice()
+
+
+def show_flashes():
+    _collect_writes()
+    for message, kind, balloons in st.session_state.pop("flashes", []):
+        st.toast(message, icon=FLASH_ICONS.get(kind))
+        if balloons:
+            st.balloons()
+
+
+def clear_login():
+    session_store.end(st.session_state.pop("session_token", None))
+    st.session_state["logged_in"] = False
+    st.session_state["username"] = ""
+    st.session_state["role"] = ""
+    st.session_state["view"] = "login"
+
+
+# Every run checks the login against the server-side session store only;
+# sessions that expired or were revoked (user deleted, password or role
+# changed) are logged out
+def check_session():
+    if not st.session_state.get("logged_in"):
+        return
+    session = session_store.get(st.session_state.get("session_token"))
+    if session is None:
+        clear_login()
+        flash("Your session has ended, please log in again.", "warning")
+    else:
+        st.session_state["username"] = session.username
+        st.session_state["role"] = session.role
 
 
 # Load external CSS
 def add_custom_css():
-    with open("css/styles.css", "r") as f:
-        css = f.read()
-    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{stylesheet('styles.css')}</style>", unsafe_allow_html=True)
 
 
 # Authentication Functions
@@ -43,40 +147,46 @@ def login():
     username = st.text_input("👤 Username")
     password = st.text_input("🔒 Password", type="password")
     if st.button("Login", key="login_submit"):
-        user = validate_user(username, password, role)
-        if user:
+        try:
+            token = log_in(username, password, role)
+        except LoginBusyError as e:
+            st.error(str(e))
+            return
+        if token:
+            st.session_state["session_token"] = token
             st.session_state["logged_in"] = True
             st.session_state["username"] = username
             st.session_state["role"] = role
             st.session_state["view"] = "homepage"
             st.session_state["show_dashboard"] = False
-            st.success(f"Logged in as {username} ({role}). Redirecting to movie recommendations...")
+            flash(f"Logged in as {username} ({role}).")
             st.rerun()
         else:
             st.error("Invalid credentials!")
 
 def add_movie_to_watchlist(movie_data):
-    if movie_data["title"] not in st.session_state["watchlist"]:
-        st.session_state["watchlist"].append(movie_data["title"])
-        add_to_watchlist(st.session_state["username"], movie_data["title"], movie_data["poster_url"], movie_data['genre'], movie_data['year'], movie_data['imdb_rating']) 
-        st.write("\n" * 2)
-        st.success(f"{movie_data['title']} added to your watchlist!")
-        time.sleep(2)
-        st.session_state["view"] = "watchlist"
-    else:
-        st.warning(f"{movie_data['title']} is already in your watchlist.")
+    title = movie_data["title"]
+    queue_write(
+        lambda added: (f"{title} added to your watchlist!", "success") if added
+        else (f"{title} is already in your watchlist.", "warning"),
+        add_to_watchlist, st.session_state["username"], movie_data["movie_id"], title, movie_data["poster_url"], movie_data['genre'], movie_data['year'], movie_data['imdb_rating'],
+        change=("add", (movie_data["movie_id"], title, movie_data["poster_url"], movie_data['genre'], movie_data['year'], movie_data['imdb_rating']))
+    )
+    st.session_state["view"] = "watchlist"
 
 
 
 def show_movie_recommendations():
     st.title('🎬 Movie Recommendation System')
 
+    movies_title = movie_titles()
+
     # Search bar input
     movie_query = st.text_input("Search for a movie:", "")
 
     # If a search query is provided, show matching suggestions
     if movie_query:
-        suggestions = [movie for movie in movies_title if movie_query.lower() in movie.lower()]
+        suggestions = search_titles(movie_query)
         if suggestions:
             selected_movie = st.selectbox("Select a movie:", suggestions)
         else:
@@ -90,46 +200,47 @@ def show_movie_recommendations():
 
     # Display recommendations when the "Recommend" button is clicked
     if st.button("Recommend", key="movie_recommend_button"):
-        recommendations = recommend(selected_movie)
-
-        with open("css/showstyles.css", "r") as f:
-            css = f.read()
-        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
-
-        # Initialize watchlist session state if not present
-        if "watchlist" not in st.session_state:
-            st.session_state["watchlist"] = []
-
-
-        for index, movie_data in enumerate(recommendations):
-            # Create a clickable card for each movie
-            with st.container():
-                col1, col2 = st.columns([1, 3])
-                with col1:
-                    # Display movie poster image, default to a placeholder if not available
-                    if movie_data["poster_url"]:
-                        st.image(movie_data["poster_url"], width=180)
-                    else:
-                        st.image("/home/rguktrkvalley/PycharmProjects/movie-recommendation/static/home_banner.png", width=180)
-
-                with col2:
-                    # Display movie details such as genre, year, IMDb rating, etc.
-                    imdb_url = f"https://www.imdb.com/title/{movie_data['imdb_id']}/"
-                    st.markdown(f"""
-                            <div class='movie-details'>
-                                <div class='title'>{movie_data['title']}</div>
-                                <p><strong>Year:</strong> {movie_data['year']}</p>
-                                <p><strong>Genre:</strong> {movie_data['genre']}</p>
-                                <p><strong>IMDb Rating:</strong> {movie_data['imdb_rating']}</p>
-                                <p><strong>IMDb Link:</strong> <a href='{imdb_url}' target='_blank'>View on IMDb</a></p>
-                                <div class='movie-plot'>{movie_data['plot']}</div>
-                            </div>
-                        """, unsafe_allow_html=True)
-
-                    st.button(
-                        f"Add to Watchlist - {movie_data['title']}",
-                        key=f"add_watchlist_{index}",
-                        on_click=add_movie_to_watchlist,
-                        args=(movie_data,)
-                    )
+        show_movie_cards(recommend(selected_movie), "add_watchlist")
+
+    # Recommendations from everything on the user's watchlist
+    if st.button("For You", key="for_you_button"):
+        recommendations = recommend_for_user(st.session_state["username"])
+        if recommendations:
+            show_movie_cards(recommendations, "add_watchlist_for_you")
+        else:
+            st.write("Add movies to your watchlist to get personalized recommendations.")
+
+
+def show_movie_cards(recommendations, key_prefix):
+    st.markdown(f"<style>{stylesheet('showstyles.css')}</style>", unsafe_allow_html=True)
+
+    posters = poster_images([movie_data["poster_url"] for movie_data in recommendations], 180)
+    for index, movie_data in enumerate(recommendations):
+        # Create a clickable card for each movie
+        with st.container():
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                # Display movie poster image, default to a placeholder if not available
+                st.image(posters[index], width=180)
+
+            with col2:
+                # Display movie details such as genre, year, IMDb rating, etc.
+                imdb_url = f"https://www.imdb.com/title/{movie_data['imdb_id']}/"
+                st.markdown(f"""
+                        <div class='movie-details'>
+                            <div class='title'>{movie_data['title']}</div>
+                            <p><strong>Year:</strong> {movie_data['year']}</p>
+                            <p><strong>Genre:</strong> {movie_data['genre']}</p>
+                            <p><strong>IMDb Rating:</strong> {movie_data['imdb_rating']}</p>
+                            <p><strong>IMDb Link:</strong> <a href='{imdb_url}' target='_blank'>View on IMDb</a></p>
+                            <div class='movie-plot'>{movie_data['plot']}</div>
+                        </div>
+                    """, unsafe_allow_html=True)
+
+                st.button(
+                    f"Add to Watchlist - {movie_data['title']}",
+                    key=f"{key_prefix}_{index}",
+                    on_click=add_movie_to_watchlist,
+                    args=(movie_data,)
+                )
 